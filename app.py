@@ -77,6 +77,7 @@ class Product(db.Model):
     in_stock = db.Column(db.Integer, nullable=False)
     selling_price = db.Column(db.Float, nullable=True)
     location = db.Column(db.String(100), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     inventory_items = db.relationship('Inventory', backref='product', lazy=True)
@@ -85,12 +86,17 @@ class Product(db.Model):
 
 # Define Inventory model
 class Inventory(db.Model):
+    __table_args__ = (
+        db.Index('ix_inventory_product_seller', 'product_id', 'seller_id'),  # stock reservation lookups
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity_in_stock = db.Column(db.Integer, nullable=False, default=0)
     quantity_sold = db.Column(db.Integer, nullable=False, default=0)
     in_stock = db.Column(db.Integer, nullable=False)
     seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     seller = db.relationship('User', backref='inventory_items')
@@ -99,6 +105,12 @@ class Inventory(db.Model):
 
 # Define Order model
 class Order(db.Model):
+    __table_args__ = (
+        db.Index('ix_order_date_sold_id', 'date_sold', 'id'),  # dashboard keyset pagination
+        db.Index('ix_order_location', 'location'),
+        db.UniqueConstraint('seller_id', 'idempotency_key', name='uq_order_seller_idempotency_key'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -111,10 +123,14 @@ class Order(db.Model):
     # ✅ NEW COLUMN
     location = db.Column(db.String(100), nullable=True)  # Added location
 
+    # Client-generated key, unique per seller; a replayed or retried order with a stored key is not inserted again
+    idempotency_key = db.Column(db.String(64), nullable=True, index=True)
+
     # ✅ RELATIONSHIP
     seller = db.relationship('User', backref='orders')
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 """
 # Define User model for authentication (admin/seller)
@@ -135,22 +151,52 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(50), nullable=False, default="seller")   # seller | admin | baker
     location = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class StockHistory(db.Model):
+    """Append-only ledger of Product.in_stock changes; rows are never updated or deleted."""
+    __table_args__ = (
+        db.Index('ix_stock_history_key_created', 'location', 'identification_number', 'created_at'),
+        db.Index('ix_stock_history_created_at', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     admin_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # who made the change
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='SET NULL'))
     seller_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     change_amount = db.Column(db.Integer)  # can be + or -
     reason = db.Column(db.String(255))  # optional note
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Ledger fields; location + identification_number outlive the product row
+    kind = db.Column(db.String(20), nullable=True)  # sale, import, adjustment, deletion
+    balance_after = db.Column(db.Integer, nullable=True)
+    location = db.Column(db.String(100), nullable=True)
+    identification_number = db.Column(db.String(100), nullable=True)
+
     admin = db.relationship('User', foreign_keys=[admin_id])
     seller = db.relationship('User', foreign_keys=[seller_id])
     product = db.relationship('Product')
 
 
+class StockSnapshot(db.Model):
+    """Per-product stock and cumulative movement totals as of taken_at, compacted from the ledger."""
+    __tablename__ = 'stock_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'identification_number', 'taken_at', name='uq_stock_snapshot_key_taken'),
+        db.Index('ix_stock_snapshot_taken_at', 'taken_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False)
+    identification_number = db.Column(db.String(100), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    in_stock = db.Column(db.Integer, nullable=False)
+    units_in = db.Column(db.Integer, nullable=False, default=0)   # total received up to taken_at
+    units_out = db.Column(db.Integer, nullable=False, default=0)  # total removed up to taken_at
+
+
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
@@ -202,38 +248,104 @@ class BakerInventory(db.Model):
     purchases = db.Column(db.JSON, nullable=False)   # e.g. list/dict with cost
     breads = db.Column(db.JSON, nullable=False)      # e.g. list/dict with ingredients
     date_sent = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='pending')
+    status = db.Column(db.String(20), default='pending', index=True)
+
+    # Computed from purchases/breads whenever the row is written (see update_cost_totals)
+    purchase_cost_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    usage_cost_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     seller = db.relationship('User', backref='baker_inventories')
 
+    def update_cost_totals(self):
+        self.purchase_cost_total = compute_purchase_cost(self.purchases)
+        self.usage_cost_total = compute_usage_cost(self.breads)
+
     @property
     def total_purchase_cost(self):
-        if not self.purchases:
-            return 0
-        if isinstance(self.purchases, dict):
-            return sum((item.get("cost", 0) or 0) for item in self.purchases.values())
-        elif isinstance(self.purchases, list):
-            return sum((item.get("cost", 0) or 0) for item in self.purchases)
-        return 0
+        return float(self.purchase_cost_total or 0)
 
     @property
     def total_usage_cost(self):
-        if not self.breads:
-            return 0
-
-        total = 0
-        if isinstance(self.breads, list):
-            for bread in self.breads:
-                # If bread has ingredients, loop through them
-                ingredients = bread.get("ingredients", [])
-                for ing in ingredients:
-                    total += ing.get("usage_cost", ing.get("cost", 0)) or 0
-        elif isinstance(self.breads, dict):
-            ingredients = self.breads.get("ingredients", [])
+        return float(self.usage_cost_total or 0)
+
+
+def compute_purchase_cost(purchases):
+    """Sum of `cost` over a submission's purchases (a list or a dict of items)."""
+    if not purchases:
+        return 0
+    if isinstance(purchases, dict):
+        return sum((item.get("cost", 0) or 0) for item in purchases.values())
+    elif isinstance(purchases, list):
+        return sum((item.get("cost", 0) or 0) for item in purchases)
+    return 0
+
+
+def compute_usage_cost(breads):
+    """Sum of ingredient usage cost over a submission's breads (a list or a single dict)."""
+    if not breads:
+        return 0
+
+    total = 0
+    if isinstance(breads, list):
+        for bread in breads:
+            # If bread has ingredients, loop through them
+            ingredients = bread.get("ingredients", [])
             for ing in ingredients:
                 total += ing.get("usage_cost", ing.get("cost", 0)) or 0
+    elif isinstance(breads, dict):
+        ingredients = breads.get("ingredients", [])
+        for ing in ingredients:
+            total += ing.get("usage_cost", ing.get("cost", 0)) or 0
 
-        return total
+    return total
+
+
+from sqlalchemy import event
+
+
+@event.listens_for(BakerInventory, 'before_insert')
+@event.listens_for(BakerInventory, 'before_update')
+def store_baker_inventory_costs(mapper, connection, target):
+    target.update_cost_totals()
+
+
+# Sales and approved baker costs per (location, day), kept current by the
+# session hooks in maintain_financial_summary; rebuild with
+# `flask rebuild-financial-summary`
+class FinancialSummary(db.Model):
+    __tablename__ = 'financial_summary'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'day', name='uq_financial_summary_location_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False, default='')
+    day = db.Column(db.Date, nullable=False, index=True)
+    sales_total = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    purchase_cost = db.Column(db.Float, nullable=False, default=0)
+    usage_cost = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Quantity and amount sold per (location, product, seller, day), maintained
+# alongside FinancialSummary; feeds the order charts
+class DailySalesRollup(db.Model):
+    __tablename__ = 'daily_sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'product_id', 'seller_id', 'day', name='uq_daily_sales_rollup_bucket'),
+        db.Index('ix_daily_sales_rollup_location_day', 'location', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False, default='')
+    product_id = db.Column(db.Integer, nullable=False)  # no FK: rows outlive deleted products
+    seller_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
 
 
 from datetime import datetime
@@ -255,82 +367,242 @@ class CreditSale(db.Model):
     seller = db.relationship('User', backref=db.backref('credit_sales', lazy=True))
 
     fully_paid = db.Column(db.Boolean, default=False, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<CreditSale {self.customer_name} - {self.bread_type} - ₦{self.amount_owing}>"
 
 
+# Sheets imports run in the background; the dashboard polls these rows
+class ImportJob(db.Model):
+    __tablename__ = 'import_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False)   # a tab name, or "__all__"
+    force = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued | running | succeeded | failed
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    unchanged = db.Column(db.Integer, nullable=False, default=0)
+    summaries = db.Column(db.JSON, nullable=True)          # per-location results
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "location": self.location,
+            "status": self.status,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "summaries": self.summaries or [],
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ExportJob(db.Model):
+    __tablename__ = 'export_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)           # sales | stock_history | financial_summary
+    params = db.Column(db.JSON, nullable=True)                # normalized filters, including the file format
+    data_version = db.Column(db.String(40), nullable=False)   # digest of the source tables when queued
+    cache_key = db.Column(db.String(40), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued | running | succeeded | failed
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(500), nullable=True)
+    file_name = db.Column(db.String(200), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params or {},
+            "status": self.status,
+            "rows_written": self.rows_written,
+            "file_name": self.file_name,
+            "file_size": self.file_size,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# What the last Sheets import saw, so unchanged tabs and rows can be skipped
+class SheetTabFingerprint(db.Model):
+    __tablename__ = 'sheet_tab_fingerprint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False, unique=True)
+    digest = db.Column(db.String(40), nullable=False)          # sha1 of the raw A2:D values
+    sellers_digest = db.Column(db.String(40), nullable=False)  # sha1 of the location's seller ids
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SheetRowFingerprint(db.Model):
+    __tablename__ = 'sheet_row_fingerprint'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'identification_number', name='uq_sheet_row_fingerprint'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False)
+    identification_number = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    in_stock = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Result of one DB -> sheet stock reconciliation run
+class StockDriftReport(db.Model):
+    __tablename__ = 'stock_drift_report'
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | succeeded | failed
+    cells_checked = db.Column(db.Integer, nullable=False, default=0)
+    cells_changed = db.Column(db.Integer, nullable=False, default=0)
+    missing_in_sheet = db.Column(db.Integer, nullable=False, default=0)  # DB products with no sheet row
+    details = db.Column(db.JSON, nullable=True)                          # [{identification_number, name, sheet_stock, db_stock}]
+    error = db.Column(db.Text, nullable=True)
+    seconds = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "location": self.location,
+            "status": self.status,
+            "cells_checked": self.cells_checked,
+            "cells_changed": self.cells_changed,
+            "missing_in_sheet": self.missing_in_sheet,
+            "details": self.details or [],
+            "error": self.error,
+            "seconds": self.seconds,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# Pending stock writes to Google Sheets (one row per sheet cell, latest value wins)
+class SheetStockUpdate(db.Model):
+    __tablename__ = 'sheet_stock_update'
+    __table_args__ = (
+        db.UniqueConstraint('sheet_name', 'identification_number', name='uq_sheet_stock_update_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sheet_name = db.Column(db.String(100), nullable=False)
+    identification_number = db.Column(db.String(100), nullable=False)
+    new_stock = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped on every coalesced write
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 
 
-import pandas as pd
-from io import BytesIO
-from flask import send_file
 
 from datetime import datetime, timedelta
+from sqlalchemy.orm import aliased
+
+STOCK_HISTORY_EXPORT_HEADER = ('Date', 'Admin', 'Product', 'Seller', 'Type', 'Change', 'Balance', 'Reason', 'Location')
+
+
+def _stock_history_filters(start_date='', end_date='', admin_id=None, product_id=None, location=''):
+    filters = date_range_filters(StockHistory.created_at, start_date, end_date)
+    if admin_id is not None:
+        filters.append(StockHistory.admin_id == admin_id)
+    if product_id is not None:
+        filters.append(StockHistory.product_id == product_id)
+    if location:
+        # Ledger rows keep their location after the product is deleted
+        filters.append(StockHistory.location == location)
+    return filters
+
+
+def stock_history_export_rows(filters):
+    """
+    Stock history export rows from one query: admin and seller usernames
+    come from two aliases of User, product name and location from an
+    outer join, so deleted products and users still export.
+    """
+    admin = aliased(User)
+    seller = aliased(User)
+    query = select(
+        StockHistory.created_at, admin.username, StockHistory.admin_id,
+        Product.name, StockHistory.identification_number, StockHistory.product_id,
+        seller.username, StockHistory.seller_id,
+        StockHistory.kind, StockHistory.change_amount, StockHistory.balance_after, StockHistory.reason,
+        StockHistory.location, Product.location
+    ).outerjoin(admin, admin.id == StockHistory.admin_id) \
+     .outerjoin(seller, seller.id == StockHistory.seller_id) \
+     .outerjoin(Product, Product.id == StockHistory.product_id) \
+     .where(*filters) \
+     .order_by(StockHistory.created_at, StockHistory.id)
+
+    for (created_at, admin_name, admin_id, product_name, identification_number, product_id,
+         seller_name, seller_id, kind, change, balance, reason, location, product_location) in stream_rows(query):
+        yield (
+            _export_time(created_at),
+            admin_name or admin_id or '',
+            product_name or identification_number or product_id or '',
+            seller_name or seller_id or '',
+            kind or '',
+            change if change is not None else '',
+            balance if balance is not None else '',
+            reason or '',
+            location or product_location or '',
+        )
+
 
 @app.route('/admin/export-stock-history', methods=['GET', 'POST'])
 def export_stock_history_excel():
     if not current_user.is_authenticated or current_user.role != 'admin':
         return "Unauthorized", 403
 
-    # Get filter values from request arguments or defaults
-    start_date_str = request.args.get('start_date', '')
-    end_date_str = request.args.get('end_date', '')
-    admin_id = request.args.get('admin_id', '')
-    product_id = request.args.get('product_id', '')
-    location = request.args.get('location', '')
-
-    query = StockHistory.query
-
-    # Apply filters
-    if start_date_str:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        query = query.filter(StockHistory.created_at >= start_date)
-    if end_date_str:
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1)
-        query = query.filter(StockHistory.created_at <= end_date)
-    if admin_id:
-        query = query.filter(StockHistory.admin_id == admin_id)
-    if product_id:
-        query = query.filter(StockHistory.product_id == product_id)
-    if location:
-        query = query.join(Product).filter(Product.location == location)
+    file_format = request.args.get('format', 'xlsx').lower()
+    if file_format not in EXPORT_FORMATS:
+        return "Format must be csv or xlsx", 400
 
-    # Explicitly load product and its location field
-    stock_changes = query.join(Product).all()  # Ensures that the Product model is loaded
+    try:
+        admin_id = request.args.get('admin_id', '')
+        product_id = request.args.get('product_id', '')
+        filters = _stock_history_filters(
+            start_date=request.args.get('start_date', ''),
+            end_date=request.args.get('end_date', ''),
+            admin_id=int(admin_id) if admin_id else None,
+            product_id=int(product_id) if product_id else None,
+            location=request.args.get('location', '')
+        )
+    except ValueError:
+        return "Dates must be YYYY-MM-DD and IDs whole numbers", 400
 
-    if not stock_changes:
+    if not db.session.query(select(StockHistory.id).where(*filters).exists()).scalar():
         return "No stock history records found to export.", 404
 
-    # Prepare data for Excel export
-    data = []
-    for entry in stock_changes:
-        location_name = ''
-        if entry.product:  # Ensure the product is loaded
-            location_name = getattr(entry.product, 'location', '')  # Get location from product
-        data.append({
-            'Date': entry.created_at.strftime('%Y-%m-%d %H:%M:%S') if entry.created_at else '',
-            'Admin': getattr(entry.admin, 'username', entry.admin_id) if entry.admin else entry.admin_id,
-            'Product': getattr(entry.product, 'name', entry.product_id) if entry.product else entry.product_id,
-            'Seller': getattr(entry.seller, 'username', entry.seller_id) if entry.seller else entry.seller_id,
-            'Change': entry.change_amount if entry.change_amount is not None else '',
-            'Reason': entry.reason or '',
-            'Location': location_name  # Ensure location is added
-        })
-
-    # Create Excel file
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Stock History')
-
-    output.seek(0)
-    return send_file(
-        output,
-        download_name='stock_history_filtered.xlsx',
-        as_attachment=True,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    rows = stock_history_export_rows(filters)
+    return export_response(file_format, 'stock_history_filtered', 'Stock History', STOCK_HISTORY_EXPORT_HEADER, rows)
 
 
 
@@ -358,16 +630,148 @@ from googleapiclient.discovery import build
 SPREADSHEET_ID = os.getenv('GOOGLE_SHEET_ID')
 SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")  # local dev only
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")  # google | memory | file:<path> (offline, see fake_sheets.py)
 
-def authenticate_google_sheets():
+import threading
+import random
+import socket
+import time
+import httplib2
+import google_auth_httplib2
+from googleapiclient.errors import HttpError
+
+# Google allows 60 requests/minute/user by default. The bucket lives in each
+# process, so the quota is shared out across the gunicorn workers.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+SHEETS_QUOTA_PER_MINUTE = float(os.getenv("SHEETS_QUOTA_PER_MINUTE", "60")) / WEB_CONCURRENCY
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "10"))            # seconds per HTTP call
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+SHEETS_MAX_QUEUE_WAIT = float(os.getenv("SHEETS_MAX_QUEUE_WAIT", "5"))  # longest wait for a rate-limit token
+SHEETS_BREAKER_THRESHOLD = int(os.getenv("SHEETS_BREAKER_THRESHOLD", "5"))
+SHEETS_BREAKER_COOLDOWN = float(os.getenv("SHEETS_BREAKER_COOLDOWN", "60"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SheetsUnavailable(Exception):
+    """Google Sheets is rate limited or unhealthy; the call was not attempted."""
+
+
+class TokenBucket:
+    """Simple token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 6)  # ~10s worth of burst
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait):
+        """Take a token, sleeping if needed. Returns seconds waited, or None if it would take too long."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            if waited + delay > max_wait:
+                return None
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial call through after `cooldown`."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+def _retryable(error):
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (socket.timeout, TimeoutError, ConnectionError, httplib2.HttpLib2Error))
+
+
+class SheetsClientManager:
     """
-    Authenticate with Google Sheets API using:
-    - SERVICE_ACCOUNT_JSON (Base64 encoded, Render env var)
-    - SERVICE_ACCOUNT_FILE (local file for dev)
+    Per-process Google Sheets client.
+
+    Credentials and the discovery-built service are created lazily on first
+    use and reused afterwards. httplib2 is not thread-safe, so each thread
+    gets its own AuthorizedHttp on top of the shared credentials, and the
+    whole cache is rebuilt if the process has forked (gunicorn --preload).
     """
-    try:
+
+    def __init__(self, backend=SHEETS_BACKEND):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._credentials = None
+        self._service = None
+        self.limiter = TokenBucket(SHEETS_QUOTA_PER_MINUTE)
+        self.breaker = CircuitBreaker(SHEETS_BREAKER_THRESHOLD, SHEETS_BREAKER_COOLDOWN)
+        self._stats_lock = threading.Lock()
+        self._stats = defaultdict(int)
+
+    def use_backend(self, service):
+        """Swap in a ready-made service object (e.g. fake_sheets.FakeSheetsService)."""
+        with self._lock:
+            self.backend = "custom"
+            self._service = service
+            self._credentials = None
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def _load_credentials(self):
+        """
+        Load credentials from:
+        - SERVICE_ACCOUNT_JSON (Base64 encoded, Render env var)
+        - SERVICE_ACCOUNT_FILE (local file for dev)
+        """
         service_account_json = os.getenv("SERVICE_ACCOUNT_JSON")
-        credentials = None
 
         # 🔹 Render: decode Base64 → JSON
         if service_account_json:
@@ -378,61 +782,163 @@ def authenticate_google_sheets():
             if "private_key" in info:
                 info["private_key"] = info["private_key"].replace("\\n", "\n")
 
-            credentials = Credentials.from_service_account_info(info, scopes=SCOPES)
+            return Credentials.from_service_account_info(info, scopes=SCOPES)
 
         # 🔹 Local: use the service_account.json file
-        elif SERVICE_ACCOUNT_FILE and os.path.exists(SERVICE_ACCOUNT_FILE):
-            credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        if SERVICE_ACCOUNT_FILE and os.path.exists(SERVICE_ACCOUNT_FILE):
+            return Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+
+        raise ValueError("No SERVICE_ACCOUNT_JSON or SERVICE_ACCOUNT_FILE found")
+
+    def _ensure(self):
+        pid = os.getpid()
+        if self._service is not None and self._pid == pid:
+            return
+
+        with self._lock:
+            if self._service is not None and self._pid == pid:
+                return
+            if self.backend == "custom" and self._service is not None:
+                self._pid = pid
+                return
+            if self.backend != "google":
+                import fake_sheets
+                self._service = fake_sheets.from_backend_setting(self.backend)
+                self._pid = pid
+                print(f"✅ Offline Google Sheets backend ready ({self.backend})")
+                return
+            credentials = self._load_credentials()
+            self._service = build("sheets", "v4", credentials=credentials, cache_discovery=False)
+            self._credentials = credentials
+            self._local = threading.local()
+            self._pid = pid
+            print("✅ Google Sheets service ready")
+
+    def service(self):
+        self._ensure()
+        return self._service
+
+    def http(self):
+        """Return this thread's authorized HTTP client."""
+        self._ensure()
+        if self._credentials is None:  # offline backend
+            return None
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=httplib2.Http(timeout=SHEETS_TIMEOUT))
+            self._local.http = http
+        return http
+
+    def _refresh_if_expired(self):
+        # Only one thread refreshes an expired token; the rest reuse it
+        credentials = self._credentials
+        if credentials is None or credentials.valid:
+            return
+        with self._lock:
+            if not credentials.valid:
+                credentials.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=SHEETS_TIMEOUT)))
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def available(self):
+        """False while the circuit breaker is open."""
+        return self.breaker.state != "open"
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self._stats)
+        counters["breaker_state"] = self.breaker.state
+        return counters
+
+    def execute(self, request):
+        """
+        Execute a googleapiclient request on this thread's connection.
+
+        Every Sheets call goes through here: it waits for a rate-limit token,
+        retries 429/5xx/timeouts with jittered exponential backoff and feeds a
+        circuit breaker. Raises SheetsUnavailable instead of calling Google
+        when the breaker is open or the token wait would exceed
+        SHEETS_MAX_QUEUE_WAIT.
+        """
+        self._ensure()
+
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise SheetsUnavailable("Google Sheets circuit breaker is open")
+
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire(SHEETS_MAX_QUEUE_WAIT)
+            if waited is None:
+                # Our own bucket ran dry; Google is fine, so leave the breaker alone
+                self._count("throttled_rejected")
+                raise SheetsUnavailable("Google Sheets rate limit reached")
+            if waited:
+                self._count("throttled")
+
+            self._count("calls")
+            try:
+                self._refresh_if_expired()
+                response = request.execute(http=self.http())
+            except Exception as e:
+                if isinstance(e, HttpError) and e.resp.status == 429:
+                    self._count("quota_errors")
+                elif isinstance(e, (socket.timeout, TimeoutError)):
+                    self._count("timeouts")
+
+                if not _retryable(e):
+                    # A bad request says nothing about Google's health
+                    self._count("errors")
+                    self.breaker.record_success()
+                    raise
+                if attempt >= SHEETS_MAX_RETRIES:
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    raise
+
+                attempt += 1
+                self._count("retries")
+                time.sleep(random.uniform(0, min(30, 0.5 * (2 ** attempt))))
+                continue
+
+            self._count("successes")
+            self.breaker.record_success()
+            return response
 
-        else:
-            raise ValueError("No SERVICE_ACCOUNT_JSON or SERVICE_ACCOUNT_FILE found")
 
-        return build("sheets", "v4", credentials=credentials)
+sheets_client = SheetsClientManager()
 
+
+def authenticate_google_sheets():
+    """Return the cached Google Sheets service, or None if it can't be built."""
+    try:
+        return sheets_client.service()
     except Exception as e:
         print(f"❌ Error during Google Sheets authentication: {e}")
         return None
 
 
-# Test once
-if authenticate_google_sheets():
-    print("✅ Google Sheets service ready")
-else:
-    print("❌ Google Sheets service failed to initialize")
-
 
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-def get_google_sheet_data_by_location(sheet_name):
-    service = authenticate_google_sheets()
 
-    # 🔹 Fetch spreadsheet metadata (list of sheet/tab names)
-    spreadsheet = service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-    available_sheets = [s['properties']['title'] for s in spreadsheet['sheets']]
+def insert_on_conflict(model):
+    """INSERT ... ON CONFLICT builder for the configured database."""
+    if db.engine.dialect.name == "sqlite":  # local dev only
+        return sqlite_insert(model)
+    return pg_insert(model)
 
-    # 🔹 Check if the requested sheet_name exists
-    if sheet_name not in available_sheets:
-        print(f"❌ Sheet '{sheet_name}' not found in spreadsheet. Available: {available_sheets}")
-        return []
 
-    # ✅ If sheet exists, fetch values
-    result = service.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{sheet_name}!A2:D"
-    ).execute()
+from sqlalchemy import case, update, insert, bindparam
 
-    values = result.get('values', [])
-    if not values:
-        print(f"No data found in sheet {sheet_name}")
-        return []
+IMPORT_CHUNK_SIZE = 1000  # rows per INSERT ... ON CONFLICT statement
 
-    sellers = User.query.filter(
-        User.location.ilike(sheet_name),
-        User.role == 'seller'
-    ).all()
-    if not sellers:
-        print(f"No sellers found for location: {sheet_name}")
-        return []
 
+def parse_sheet_rows(values):
+    """Turn raw A:D sheet rows into product dicts."""
     formatted_data = []
     for row in values:
         name = row[0] if len(row) > 0 else ''
@@ -451,209 +957,1663 @@ def get_google_sheet_data_by_location(sheet_name):
             'price': price,
             'in_stock': in_stock,
         })
+    return formatted_data
 
-    inventory_to_add = []
 
-    for product_data in formatted_data:
-        existing = Product.query.filter_by(
-            identification_number=product_data['identification_number'],
-            location=sheet_name
-        ).first()
+import hashlib
 
-        if not existing:
-            # Create new product if it doesn't exist
-            product = Product(
-                name=product_data['name'],
-                identification_number=product_data['identification_number'],
-                price=product_data['price'],
-                selling_price=None,
-                location=sheet_name,
-                in_stock=product_data['in_stock']
-            )
-            db.session.add(product)
-            db.session.commit()
 
-            for seller in sellers:
-                if seller.location == sheet_name:
-                    inventory = Inventory(
-                        product_id=product.id,
-                        seller_id=seller.id,
-                        quantity_in_stock=product_data['in_stock'],
-                        in_stock=product_data['in_stock']
-                    )
-                    inventory_to_add.append(inventory)
+def _digest(payload):
+    return hashlib.sha1(json.dumps(payload, separators=(',', ':')).encode("utf-8")).hexdigest()
 
-        else:
-            # When updating product, only increase stock if sheet stock is higher
-            existing.name = product_data['name']
-            existing.price = product_data['price']
-            if product_data['in_stock'] > existing.in_stock:
-                existing.in_stock += (product_data['in_stock'] - existing.in_stock)
-            db.session.commit()
 
-            for seller in sellers:
-                if seller.location == sheet_name:
-                    existing_inventory = Inventory.query.filter_by(
-                        product_id=existing.id,
-                        seller_id=seller.id
-                    ).first()
-
-                    if existing_inventory:
-                        # Add stock from sheet if necessary, don't overwrite reduced stock
-                        if product_data['in_stock'] > existing_inventory.quantity_in_stock:
-                            difference = product_data['in_stock'] - existing_inventory.quantity_in_stock
-                            existing_inventory.quantity_in_stock += difference
-                            existing_inventory.in_stock += difference
-                    else:
-                        # Create new seller inventory
-                        inventory = Inventory(
-                            product_id=existing.id,
-                            seller_id=seller.id,
-                            quantity_in_stock=product_data['in_stock'],
-                            in_stock=product_data['in_stock']
-                        )
-                        inventory_to_add.append(inventory)
-
-    db.session.add_all(inventory_to_add)
-    db.session.commit()
+def _chunks(items, size=IMPORT_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-    print(f"✅ Imported and updated {len(formatted_data)} products for {sheet_name}")
-    return formatted_data
 
+def import_sheet_rows(sheet_name, values, sellers, force=False):
+    """
+    Upsert one tab's rows into Product/Inventory in a single transaction.
+
+    The importer remembers a fingerprint of the whole tab and of every
+    row's name/price/stock. An identical tab is skipped outright; otherwise
+    only rows whose fingerprint moved are diffed against the DB, using one
+    query for products and one for seller inventories, and written with
+    INSERT ... ON CONFLICT. As before, sheet stock only ever raises DB
+    stock, never lowers it. A new seller set or force=True re-checks every
+    row. Returns a summary with inserted/updated/unchanged counts and timing.
+    """
+    started = time.perf_counter()
+
+    seller_ids = sorted(seller.id for seller in sellers if (seller.location or '').lower() == sheet_name.lower())
+    tab_digest = _digest(values)
+    sellers_digest = _digest(seller_ids)
+
+    tab = SheetTabFingerprint.query.filter_by(location=sheet_name).first()
+    full_pass = force or tab is None or tab.sellers_digest != sellers_digest
+
+    # Collapse duplicate IDs: last name/price wins, highest stock wins
+    sheet_rows = {}
+    for product_data in parse_sheet_rows(values):
+        identification_number = product_data['identification_number'].strip()
+        if not identification_number:
+            continue
+        product_data['identification_number'] = identification_number
+        previous = sheet_rows.get(identification_number)
+        if previous:
+            product_data['in_stock'] = max(product_data['in_stock'], previous['in_stock'])
+        sheet_rows[identification_number] = product_data
+
+    summary = {
+        'location': sheet_name,
+        'rows': len(sheet_rows),
+        'inserted': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'inventory_inserted': 0,
+        'inventory_updated': 0,
+    }
 
+    if not full_pass and tab.digest == tab_digest:
+        summary['unchanged'] = len(sheet_rows)
+        summary['tab_unchanged'] = True
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        print(f"✅ Imported {sheet_name}: tab unchanged since last import")
+        return summary
 
-@app.route('/import-products', methods=['POST'])
-def import_all_products():
-    # Get the location from the form, or default to "Accra" if not specified
-    location = request.form.get('location', 'Ikota Complex')  # Default to 'Accra' if not provided
+    if full_pass:
+        changed_rows = sheet_rows
+    else:
+        fingerprints = {
+            row.identification_number: (row.name, row.price, row.in_stock)
+            for row in db.session.query(
+                SheetRowFingerprint.identification_number, SheetRowFingerprint.name,
+                SheetRowFingerprint.price, SheetRowFingerprint.in_stock
+            ).filter(SheetRowFingerprint.location == sheet_name)
+        }
+        changed_rows = {
+            identification_number: product_data
+            for identification_number, product_data in sheet_rows.items()
+            if fingerprints.get(identification_number) != (
+                product_data['name'], product_data['price'], product_data['in_stock']
+            )
+        }
+    summary['unchanged'] = len(sheet_rows) - len(changed_rows)
+
+    existing = {}
+    if changed_rows:
+        query = db.session.query(
+            Product.id, Product.identification_number, Product.name, Product.price, Product.in_stock
+        ).filter(Product.location == sheet_name)
+        if full_pass:
+            existing = {row.identification_number: row for row in query}
+        else:
+            for chunk in _chunks(changed_rows):
+                existing.update(
+                    (row.identification_number, row)
+                    for row in query.filter(Product.identification_number.in_(chunk))
+                )
+
+    to_write = []
+    for identification_number, product_data in changed_rows.items():
+        current = existing.get(identification_number)
+        if current is None:
+            summary['inserted'] += 1
+        elif (current.name != product_data['name'] or current.price != product_data['price']
+              or product_data['in_stock'] > current.in_stock):
+            summary['updated'] += 1
+        else:
+            summary['unchanged'] += 1
+            continue
+        to_write.append({
+            'name': product_data['name'],
+            'identification_number': identification_number,
+            'price': product_data['price'],
+            'selling_price': None,
+            'location': sheet_name,
+            'in_stock': product_data['in_stock'],
+        })
 
+    inventory_to_add = []
+    inventory_to_update = []
     try:
-        # Get the sheet data for the given location
-        sheet_data = get_google_sheet_data_by_location(location)
-        
-        if not sheet_data:
-            flash(f"No data found for location {location}. Please check the sheet name.", "danger")
-            return redirect(url_for('admin_dashboard'))
+        product_ids = {identification_number: row.id for identification_number, row in existing.items()}
+
+        for chunk in _chunks(to_write):
+            stmt = insert_on_conflict(Product).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['identification_number', 'location'],  # uq_product_identification_per_location
+                set_={
+                    'name': stmt.excluded.name,
+                    'price': stmt.excluded.price,
+                    'updated_at': datetime.utcnow(),  # set_ does not apply onupdate
+                    'in_stock': case(
+                        (stmt.excluded.in_stock > Product.in_stock, stmt.excluded.in_stock),
+                        else_=Product.in_stock
+                    ),
+                }
+            ).returning(Product.id, Product.identification_number, Product.in_stock)
+            for product_id, identification_number, in_stock in db.session.execute(stmt):
+                product_ids[identification_number] = product_id
+                current = existing.get(identification_number)
+                record_stock_movement(
+                    'import', sheet_name, identification_number,
+                    in_stock - (current.in_stock if current else 0), in_stock,
+                    product_id=product_id, reason='Google Sheet import'
+                )
 
-        # Process the sheet data and update the admin dashboard
-        flash(f"Successfully imported products for {location}!", "success")
+        inventories = {}
+        if seller_ids and existing:
+            query = db.session.query(
+                Inventory.id, Inventory.product_id, Inventory.seller_id,
+                Inventory.quantity_in_stock, Inventory.in_stock
+            ).filter(Inventory.seller_id.in_(seller_ids))
+            if full_pass:
+                query = query.join(Product, Product.id == Inventory.product_id).filter(
+                    Product.location == sheet_name
+                )
+                inventories = {(inv.product_id, inv.seller_id): inv for inv in query}
+            else:
+                for chunk in _chunks(row.id for row in existing.values()):
+                    inventories.update(
+                        ((inv.product_id, inv.seller_id), inv)
+                        for inv in query.filter(Inventory.product_id.in_(chunk))
+                    )
 
-    except Exception as e:
-        # Handle any unexpected errors
-        flash(f"An error occurred while importing data: {str(e)}", "danger")
+        for identification_number, product_data in changed_rows.items():
+            product_id = product_ids[identification_number]
+            sheet_stock = product_data['in_stock']
+            for seller_id in seller_ids:
+                inventory = inventories.get((product_id, seller_id))
+                if inventory is None:
+                    inventory_to_add.append({
+                        'product_id': product_id,
+                        'seller_id': seller_id,
+                        'quantity_in_stock': sheet_stock,
+                        'in_stock': sheet_stock,
+                    })
+                elif sheet_stock > inventory.quantity_in_stock:
+                    # Add stock from sheet if necessary, don't overwrite reduced stock
+                    difference = sheet_stock - inventory.quantity_in_stock
+                    inventory_to_update.append({
+                        'id': inventory.id,
+                        'quantity_in_stock': sheet_stock,
+                        'in_stock': inventory.in_stock + difference,
+                    })
+
+        if inventory_to_add:
+            db.session.execute(insert(Inventory), inventory_to_add)
+        if inventory_to_update:
+            db.session.execute(update(Inventory), inventory_to_update)
+
+        # Remember what we imported so the next sync can skip it
+        now = datetime.utcnow()
+        for chunk in _chunks(changed_rows.values()):
+            stmt = insert_on_conflict(SheetRowFingerprint).values([
+                {
+                    'location': sheet_name,
+                    'identification_number': product_data['identification_number'],
+                    'name': product_data['name'],
+                    'price': product_data['price'],
+                    'in_stock': product_data['in_stock'],
+                    'updated_at': now,
+                }
+                for product_data in chunk
+            ])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['location', 'identification_number'],
+                set_={
+                    'name': stmt.excluded.name,
+                    'price': stmt.excluded.price,
+                    'in_stock': stmt.excluded.in_stock,
+                    'updated_at': stmt.excluded.updated_at,
+                }
+            ))
+
+        if tab is None:
+            tab = SheetTabFingerprint(location=sheet_name)
+            db.session.add(tab)
+        tab.digest = tab_digest
+        tab.sellers_digest = sellers_digest
+        tab.row_count = len(sheet_rows)
+        tab.imported_at = now
 
-    return redirect(url_for('admin_dashboard'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
+    summary['inventory_inserted'] = len(inventory_to_add)
+    summary['inventory_updated'] = len(inventory_to_update)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
 
+    print(
+        f"✅ Imported {sheet_name}: {summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['unchanged']} unchanged in {summary['seconds']}s"
+    )
+    return summary
 
-@app.route('/products/<location>')
-def get_products_by_seller_location(location):
-    seller = User.query.filter_by(location=location.lower(), role='seller').first()
-    if not seller:
-        return jsonify([])
 
-    products = Product.query.filter_by(seller_id=seller.id).all()
-    return jsonify([
-        {
-            "name": p.name,
-            "price": p.price,
-            "stock": p.in_stock,
-            "id": p.identification_number
-        } for p in products
-    ])
+def forget_sheet_fingerprints(location=None):
+    """Make the next import re-check every row (e.g. after products were deleted)."""
+    for model in (SheetRowFingerprint, SheetTabFingerprint):
+        query = model.query
+        if location is not None:
+            query = query.filter_by(location=location)
+        query.delete(synchronize_session=False)
 
 
-@app.route('/admin/products')
-def get_all_products_for_admin():
-    # Optional: Add admin-only check here if you have authentication
-    products = Product.query.all()
-    
-    return jsonify([
-        {
-            "name": p.name,
-            "price": p.price,
-            "stock": p.in_stock,
-            "id": p.identification_number,
-            "seller": p.seller.username if p.seller else "Unknown",
-            "location": p.seller.location if p.seller else "Unknown"
-        } for p in products
-    ])
+_sheet_titles = {'loaded_at': None, 'titles': []}
+_sheet_titles_lock = threading.Lock()
 
 
+def get_sheet_titles(refresh=False):
+    """Tab names of the spreadsheet, cached like the row index."""
+    with _sheet_titles_lock:
+        loaded_at = _sheet_titles['loaded_at']
+        if not refresh and loaded_at is not None and time.monotonic() - loaded_at < SHEET_ROW_INDEX_TTL:
+            return list(_sheet_titles['titles'])
 
-def update_google_sheet_stock(sheet_name, identification_number, new_stock):
-    service = authenticate_google_sheets()
-    sheet = service.spreadsheets()
+    spreadsheet = sheets_client.execute(sheets_client.service().spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID,
+        fields="sheets.properties.title"
+    ))
+    titles = [s['properties']['title'] for s in spreadsheet['sheets']]
 
-    try:
-        # Read current data from the sheet
-        result = sheet.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{sheet_name}!A2:D"
-        ).execute()
+    with _sheet_titles_lock:
+        _sheet_titles['loaded_at'] = time.monotonic()
+        _sheet_titles['titles'] = titles
+    return list(titles)
 
-        values = result.get('values', [])
-        if not values:
-            print(f"No data found in sheet {sheet_name}")
-            return
 
-        # Locate the row with matching product ID
-        row_number = None
-        for idx, row in enumerate(values, start=2):  # start=2 because data starts from row 2
-            if len(row) > 1 and row[1] == identification_number:
-                row_number = idx
-                break
+def get_google_sheet_data_by_location(sheet_name, force=False):
+    """Import one location's tab. Returns an import summary, or None if there was nothing to import."""
+    service = sheets_client.service()
 
-        if row_number:
-            update_range = f"{sheet_name}!D{row_number}"
-            update_body = {
-                "values": [[str(new_stock)]]
-            }
+    # 🔹 Spreadsheet metadata (list of sheet/tab names); re-read if the tab is new
+    available_sheets = get_sheet_titles()
+    if sheet_name not in available_sheets:
+        available_sheets = get_sheet_titles(refresh=True)
 
-            sheet.values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=update_range,
-                valueInputOption="RAW",
-                body=update_body
-            ).execute()
+    # 🔹 Check if the requested sheet_name exists
+    if sheet_name not in available_sheets:
+        print(f"❌ Sheet '{sheet_name}' not found in spreadsheet. Available: {available_sheets}")
+        return None
 
-            print(f"✅ Google Sheet updated: {sheet_name} -> Row {row_number} -> Stock: {new_stock}")
-        else:
-            print(f"❌ Product with ID {identification_number} not found in sheet {sheet_name}.")
+    # ✅ If sheet exists, fetch values
+    result = sheets_client.execute(service.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f"{sheet_name}!A2:D"
+    ))
 
-    except Exception as e:
-        print(f"❌ Error updating Google Sheet: {e}")
+    values = result.get('values', [])
+    sheet_row_index.load(sheet_name, values)
+    if not values:
+        print(f"No data found in sheet {sheet_name}")
+        return None
+
+    sellers = User.query.filter(
+        User.location.ilike(sheet_name),
+        User.role == 'seller'
+    ).all()
+    if not sellers:
+        print(f"No sellers found for location: {sheet_name}")
+        return None
 
+    return import_sheet_rows(sheet_name, values, sellers, force=force)
 
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-@app.route('/delete_product/<int:product_id>', methods=['POST'])
-def delete_product(product_id):
-    product = Product.query.get(product_id)
-    if product:
+SHEET_IMPORT_WORKERS = int(os.getenv("SHEET_IMPORT_WORKERS", "4"))  # keep below the DB pool size
+ALL_LOCATIONS = "__all__"
+IMPORT_STALE_SECONDS = 3600        # a queued/running import older than this is assumed lost with its worker
+
+
+def _import_location_worker(sheet_name, values, force=False):
+    # Each worker has its own app context, so its own session and transaction
+    with app.app_context():
+        try:
+            sellers = User.query.filter(
+                User.location.ilike(sheet_name),
+                User.role == 'seller'
+            ).all()
+            if not values:
+                return {'location': sheet_name, 'skipped': 'no data'}
+            if not sellers:
+                return {'location': sheet_name, 'skipped': 'no sellers'}
+            return import_sheet_rows(sheet_name, values, sellers, force=force)
+        except Exception as e:
+            print(f"❌ Import failed for {sheet_name}: {e}")
+            return {'location': sheet_name, 'error': str(e)}
+
+
+def import_all_locations(max_workers=SHEET_IMPORT_WORKERS, force=False, on_progress=None):
+    """
+    Import every tab that matches a seller location.
+
+    All tabs are fetched with a single values().batchGet, then imported
+    concurrently on a bounded pool. on_progress, if given, is called on
+    this thread with the summaries finished so far as each tab completes.
+    Returns one summary per location.
+    """
+    started = time.perf_counter()
+
+    seller_locations = {
+        (location or '').lower()
+        for (location,) in db.session.query(User.location).filter(User.role == 'seller').distinct()
+    }
+    titles = [title for title in get_sheet_titles(refresh=True) if title.lower() in seller_locations]
+    if not titles:
+        return []
+
+    result = sheets_client.execute(sheets_client.service().spreadsheets().values().batchGet(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"{title}!A2:D" for title in titles]
+    ))
+    value_ranges = result.get('valueRanges', [])
+
+    tabs = []
+    for title, value_range in zip(titles, value_ranges):
+        values = value_range.get('values', [])
+        sheet_row_index.load(title, values)
+        tabs.append((title, values))
+
+    # Release this thread's connection before the workers take theirs
+    db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tabs)))) as pool:
+        futures = [pool.submit(_import_location_worker, *tab, force=force) for tab in tabs]
+        finished = []
+        for future in as_completed(futures):
+            finished.append(future.result())
+            if on_progress:
+                on_progress(finished)
+        summaries = [future.result() for future in futures]
+
+    print(f"✅ Imported {len(summaries)} location(s) in {time.perf_counter() - started:.3f}s")
+    return summaries
+
+
+def format_import_summary(summary):
+    if 'error' in summary:
+        return f"{summary['location']}: failed ({summary['error']})"
+    if 'skipped' in summary:
+        return f"{summary['location']}: skipped ({summary['skipped']})"
+    if summary.get('tab_unchanged'):
+        return f"{summary['location']}: no changes since last import"
+    return (
+        f"{summary['location']}: {summary['inserted']} new, {summary['updated']} updated, "
+        f"{summary['unchanged']} unchanged ({summary['seconds']}s)"
+    )
+
+
+
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+
+_background = {'pid': None, 'executor': None}
+_background_lock = threading.Lock()
+
+
+def submit_background(fn, *args, **kwargs):
+    """Run fn on this worker's background pool (created lazily, fork-aware)."""
+    pid = os.getpid()
+    with _background_lock:
+        if _background['executor'] is None or _background['pid'] != pid:
+            _background['executor'] = ThreadPoolExecutor(
+                max_workers=BACKGROUND_WORKERS, thread_name_prefix="background"
+            )
+            _background['pid'] = pid
+        return _background['executor'].submit(fn, *args, **kwargs)
+
+
+def _apply_import_summaries(job, summaries):
+    job.summaries = list(summaries)
+    job.rows = sum(s.get('rows', 0) for s in summaries)
+    job.inserted = sum(s.get('inserted', 0) for s in summaries)
+    job.updated = sum(s.get('updated', 0) for s in summaries)
+    job.unchanged = sum(s.get('unchanged', 0) for s in summaries)
+
+
+def run_import_job(job_id):
+    """Run a queued ImportJob, recording counts after each tab and the final outcome."""
+
+    def report_progress(summaries):
+        try:
+            _apply_import_summaries(db.session.get(ImportJob, job_id), summaries)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Could not record progress for import job #{job_id}: {e}")
+
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        if job is None or job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        location, force = job.location, job.force
+        db.session.commit()
+
+        try:
+            if location == ALL_LOCATIONS:
+                summaries = import_all_locations(force=force, on_progress=report_progress)
+            else:
+                summary = get_google_sheet_data_by_location(location, force=force)
+                summaries = [summary] if summary else [{'location': location, 'skipped': 'no data'}]
+            error = "; ".join(f"{s['location']}: {s['error']}" for s in summaries if 'error' in s) or None
+        except Exception as e:
+            db.session.rollback()
+            summaries, error = [], str(e)
+
+        # Imports may have recycled the session, so reload the job
+        db.session.remove()
+        job = db.session.get(ImportJob, job_id)
+        _apply_import_summaries(job, summaries)
+        job.error = error
+        job.status = 'failed' if error else 'succeeded'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        print(f"{'❌' if error else '✅'} Import job #{job_id} {job.status}")
+        return job.to_dict()
+
+
+def fail_stale_import_jobs(now=None):
+    """Mark queued/running jobs older than IMPORT_STALE_SECONDS as failed; their worker is gone."""
+    stale_before = (now or datetime.utcnow()) - timedelta(seconds=IMPORT_STALE_SECONDS)
+    failed = ImportJob.query.filter(
+        ImportJob.status.in_(('queued', 'running')), ImportJob.created_at < stale_before
+    ).update({
+        'status': 'failed',
+        'error': 'Worker stopped before the import finished',
+        'finished_at': datetime.utcnow(),
+    }, synchronize_session='fetch')
+    db.session.commit()
+    return failed
+
+
+def import_location_label(location):
+    return "all locations" if location == ALL_LOCATIONS else location
+
+
+def queue_import_job(location, force=False):
+    fail_stale_import_jobs()
+    job = ImportJob(
+        location=location,
+        force=force,
+        requested_by=current_user.id if current_user.is_authenticated else None
+    )
+    db.session.add(job)
+    db.session.commit()
+    submit_background(run_import_job, job.id)
+    return job
+
+
+@app.route('/import-products', methods=['POST'])
+def import_all_products():
+    # Get the location from the form, or default to "Accra" if not specified
+    location = request.form.get('location', 'Ikota Complex')  # Default to 'Accra' if not provided
+
+    try:
+        job = queue_import_job(location)
+        flash(f"Import for {import_location_label(location)} started (job #{job.id}).", "success")
+        return redirect(url_for('admin_dashboard', import_job=job.id))
+
+    except Exception as e:
+        # Handle any unexpected errors
+        flash(f"An error occurred while importing data: {str(e)}", "danger")
+
+    return redirect(url_for('admin_dashboard'))
+
+
+@app.route('/admin/import-jobs/<int:job_id>')
+@login_required
+def import_job_status(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in ('queued', 'running'):
+        fail_stale_import_jobs()
+    return jsonify(job.to_dict())
+
+
+import click
+
+
+@app.cli.command("import-sheets")
+@click.option("--location", default=ALL_LOCATIONS, help="Tab to import (default: every location).")
+@click.option("--force", is_flag=True, help="Re-check every row even if the sheet looks unchanged.")
+def import_sheets_command(location, force):
+    """Import products from Google Sheets without going through the web app."""
+    job = ImportJob(location=location, force=force)
+    db.session.add(job)
+    db.session.commit()
+
+    result = run_import_job(job.id)
+    for summary in result['summaries']:
+        print(f"   {format_import_summary(summary)}")
+    if result['status'] == 'failed':
+        raise SystemExit(1)
+
+
+
+@app.route('/products/<location>')
+def get_products_by_seller_location(location):
+    seller = User.query.filter_by(location=location.lower(), role='seller').first()
+    if not seller:
+        return jsonify([])
+
+    products = Product.query.filter_by(seller_id=seller.id).all()
+    return jsonify([
+        {
+            "name": p.name,
+            "price": p.price,
+            "stock": p.in_stock,
+            "id": p.identification_number
+        } for p in products
+    ])
+
+
+@app.route('/admin/products')
+def get_all_products_for_admin():
+    # Optional: Add admin-only check here if you have authentication
+    products = Product.query.all()
+    
+    return jsonify([
+        {
+            "name": p.name,
+            "price": p.price,
+            "stock": p.in_stock,
+            "id": p.identification_number,
+            "seller": p.seller.username if p.seller else "Unknown",
+            "location": p.seller.location if p.seller else "Unknown"
+        } for p in products
+    ])
+
+
+
+SHEET_ROW_INDEX_TTL = float(os.getenv("SHEET_ROW_INDEX_TTL", "300"))  # seconds before a tab is re-read
+
+
+def _row_numbers_from_values(values, id_column):
+    """Map identification_number -> sheet row number (data starts at row 2)."""
+    row_numbers = {}
+    for idx, row in enumerate(values, start=2):
+        if len(row) > id_column and row[id_column] and row[id_column] not in row_numbers:
+            row_numbers[row[id_column]] = idx
+    return row_numbers
+
+
+def read_sheet_row_numbers(sheet_name):
+    """Read only the ID column of a tab and map it to row numbers."""
+    result = sheets_client.execute(sheets_client.service().spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f"{sheet_name}!B2:B"
+    ))
+    return _row_numbers_from_values(result.get('values', []), 0)
+
+
+class SheetRowIndex:
+    """
+    In-process identification_number -> row number cache per sheet tab.
+
+    The Sheets values API exposes no ETag, so each tab is trusted for
+    SHEET_ROW_INDEX_TTL seconds and re-read after that. A cached tab is
+    also re-read when an ID is missing or when column B no longer holds
+    the expected ID at a cached row (rows inserted or deleted by hand), so
+    writers call locate() rather than trusting the cache. Imports refresh
+    the tab from the range they already downloaded.
+    """
+
+    def __init__(self, ttl=SHEET_ROW_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tabs = {}  # sheet_name -> (loaded_at, {identification_number: row_number})
+
+    def load(self, sheet_name, values, id_column=1):
+        """Replace a tab's index from rows read starting at A2 (IDs in column B)."""
+        row_numbers = _row_numbers_from_values(values, id_column)
+        with self._lock:
+            self._tabs[sheet_name] = (time.monotonic(), row_numbers)
+        return row_numbers
+
+    def invalidate(self, sheet_name=None):
+        with self._lock:
+            if sheet_name is None:
+                self._tabs.clear()
+            else:
+                self._tabs.pop(sheet_name, None)
+
+    def _refresh(self, sheet_name):
+        row_numbers = read_sheet_row_numbers(sheet_name)
+        with self._lock:
+            self._tabs[sheet_name] = (time.monotonic(), row_numbers)
+        return row_numbers
+
+    def _ids_match(self, sheet_name, expected):
+        """True if column B still holds each ID at its cached row ({identification_number: row})."""
+        result = sheets_client.execute(sheets_client.service().spreadsheets().values().batchGet(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=[f"{sheet_name}!B{row_number}" for row_number in expected.values()]
+        ))
+        for identification_number, value_range in zip(expected, result.get('valueRanges', [])):
+            values = value_range.get('values') or [[None]]
+            if values[0][0] != identification_number:
+                return False
+        return True
+
+    def locate(self, sheet_name, identification_numbers):
+        """
+        {identification_number: row number or None} for one tab, checked
+        against the sheet: a cached tab with a missing or moved ID is re-read.
+        """
+        with self._lock:
+            loaded_at, row_numbers = self._tabs.get(sheet_name, (None, None))
+
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            row_numbers = self._refresh(sheet_name)
+        else:
+            found = {idn: row_numbers[idn] for idn in identification_numbers if idn in row_numbers}
+            if len(found) < len(set(identification_numbers)) or (found and not self._ids_match(sheet_name, found)):
+                self.invalidate(sheet_name)
+                row_numbers = self._refresh(sheet_name)
+
+        return {idn: row_numbers.get(idn) for idn in identification_numbers}
+
+    def row_number(self, sheet_name, identification_number):
+        """Row holding identification_number in sheet_name, or None."""
+        return self.locate(sheet_name, [identification_number])[identification_number]
+
+
+sheet_row_index = SheetRowIndex()
+
+
+def update_google_sheet_stock(sheet_name, identification_number, new_stock):
+    """Write one stock cell inline; if Sheets is unavailable the write is queued and the caller commits."""
+    try:
+        row_number = sheet_row_index.row_number(sheet_name, identification_number)
+
+        if row_number:
+            update_range = f"{sheet_name}!D{row_number}"
+            update_body = {
+                "values": [[str(new_stock)]]
+            }
+
+            sheets_client.execute(sheets_client.service().spreadsheets().values().update(
+                spreadsheetId=SPREADSHEET_ID,
+                range=update_range,
+                valueInputOption="RAW",
+                body=update_body
+            ))
+
+            print(f"✅ Google Sheet updated: {sheet_name} -> Row {row_number} -> Stock: {new_stock}")
+        else:
+            print(f"❌ Product with ID {identification_number} not found in sheet {sheet_name}.")
+
+    except SheetsUnavailable as e:
+        # Don't lose the write: hand it to the write-behind queue
+        print(f"⚠️ {e}; deferring stock update for {identification_number}")
+        enqueue_sheet_stock_update(sheet_name, identification_number, new_stock)
+
+    except Exception as e:
+        print(f"❌ Error updating Google Sheet: {e}")
+
+
+
+SHEET_SYNC_INTERVAL = float(os.getenv("SHEET_SYNC_INTERVAL", "5"))      # seconds between flushes
+SHEET_SYNC_BATCH_SIZE = int(os.getenv("SHEET_SYNC_BATCH_SIZE", "50"))   # flush early at this many writes
+SHEET_SYNC_LEASE = 60                                                  # seconds a claimed row is hidden
+SHEET_SYNC_MAX_ATTEMPTS = int(os.getenv("SHEET_SYNC_MAX_ATTEMPTS", "10"))  # then the write is parked
+SHEET_SYNC_PARKED = datetime(9999, 12, 31)  # next_attempt_at of a parked write; a new write to the cell revives it
+
+
+def remember_sheet_stock_writes(writes):
+    """Record stock we wrote to the sheet in the import fingerprints."""
+    if not writes:
+        return
+    db.session.execute(
+        update(SheetRowFingerprint.__table__)
+        .where(
+            SheetRowFingerprint.location == bindparam('b_location'),
+            SheetRowFingerprint.identification_number == bindparam('b_identification_number')
+        )
+        .values(in_stock=bindparam('b_in_stock')),
+        [
+            {'b_location': sheet_name, 'b_identification_number': identification_number, 'b_in_stock': new_stock}
+            for sheet_name, identification_number, new_stock in writes
+        ]
+    )
+
+
+class SheetStockSyncQueue:
+    """
+    Write-behind queue for Google Sheet stock cells.
+
+    Requests only upsert a SheetStockUpdate row inside their own transaction,
+    so repeated sales of one product collapse into its latest stock value and
+    nothing is lost if the worker restarts. A daemon thread per worker drains
+    the table every SHEET_SYNC_INTERVAL seconds (or sooner once
+    SHEET_SYNC_BATCH_SIZE writes are waiting) with one values().batchUpdate.
+    """
+
+    def __init__(self, interval=SHEET_SYNC_INTERVAL, batch_size=SHEET_SYNC_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = 0
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, sheet_name, identification_number, new_stock):
+        """Queue a stock write in the current session; the caller commits."""
+        self.enqueue_many([(sheet_name, identification_number, new_stock)])
+
+    def enqueue_many(self, writes):
+        """Queue several (sheet_name, identification_number, new_stock) writes with one upsert."""
+        latest = {}
+        for sheet_name, identification_number, new_stock in writes:
+            latest[(sheet_name, identification_number)] = new_stock  # one row per cell per statement
+        if not latest:
+            return
+
+        now = datetime.utcnow()
+        stmt = insert_on_conflict(SheetStockUpdate).values([
+            {
+                'sheet_name': sheet_name,
+                'identification_number': identification_number,
+                'new_stock': new_stock,
+                'version': 1,
+                'attempts': 0,
+                'next_attempt_at': now,
+                'created_at': now,
+            }
+            for (sheet_name, identification_number), new_stock in latest.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['sheet_name', 'identification_number'],
+            set_={
+                'new_stock': stmt.excluded.new_stock,
+                'version': SheetStockUpdate.version + 1,
+                'attempts': 0,
+                'next_attempt_at': stmt.excluded.next_attempt_at,
+            }
+        )
+        db.session.execute(stmt)
+
+        self.start()
+        with self._lock:
+            self._pending += len(latest)
+            if self._pending >= self.batch_size:
+                self._wake.set()
+
+    def start(self):
+        """Start this worker's flush thread (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="sheet-stock-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                self._pending = 0
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"❌ Sheet stock sync failed: {e}")
+
+    def _claim(self):
+        """Lease up to batch_size due rows so other workers skip them."""
+        now = datetime.utcnow()
+        rows = (
+            SheetStockUpdate.query
+            .filter(SheetStockUpdate.next_attempt_at <= now)
+            .order_by(SheetStockUpdate.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        claimed = [
+            (row.id, row.version, row.sheet_name, row.identification_number, row.new_stock, row.attempts)
+            for row in rows
+        ]
+        for row in rows:
+            row.next_attempt_at = now + timedelta(seconds=SHEET_SYNC_LEASE)
+        db.session.commit()
+        return claimed
+
+    def flush(self):
+        """
+        Push all due writes to the sheet. Returns the number of cells written.
+
+        Rows are resolved and written per tab, so a deleted or renamed tab
+        only sends its own rows to _retry_later.
+        """
+        written = 0
+        while True:
+            if not sheets_client.available():
+                return written  # leave rows due; retried once the breaker closes
+
+            claimed = self._claim()
+            if not claimed:
+                return written
+
+            by_tab = defaultdict(list)
+            for entry in claimed:
+                by_tab[entry[2]].append(entry)
+
+            cells = {}       # sheet_name -> [(claimed entry, row number)]
+            missing = []     # claimed entries whose product is not in the sheet
+            failed = []      # (claimed entries, error)
+            for sheet_name, entries in by_tab.items():
+                try:
+                    located = self._locate(sheet_name, entries)
+                except Exception as e:
+                    failed.append((entries, e))
+                    continue
+                missing.extend(entry for entry, row_number in located if not row_number)
+                found = [(entry, row_number) for entry, row_number in located if row_number]
+                if found:
+                    cells[sheet_name] = found
+
+            failed.extend(self._write(cells))
+            failed_tabs = {entries[0][2] for entries, _ in failed}
+            written_cells = [
+                entry for sheet_name, found in cells.items() if sheet_name not in failed_tabs
+                for entry, _ in found
+            ]
+
+            # Only drop rows nobody re-queued while we were talking to Google
+            for update_id, version, *_ in written_cells + missing:
+                SheetStockUpdate.query.filter_by(id=update_id, version=version).delete()
+
+            # Our own stock writes shouldn't look like sheet edits to the next import
+            remember_sheet_stock_writes([
+                (sheet_name, identification_number, new_stock)
+                for _, _, sheet_name, identification_number, new_stock, _ in written_cells
+            ])
+            db.session.commit()
+
+            written += len(written_cells)
+            if written_cells:
+                print(f"✅ Google Sheet updated: {len(written_cells)} stock cell(s)")
+
+            for entries, error in failed:
+                self._retry_later(entries, error)
+            if failed:
+                return written
+
+    def _locate(self, sheet_name, entries):
+        """Pair each claimed entry of one tab with its row number (None if not in the sheet)."""
+        row_numbers = sheet_row_index.locate(sheet_name, [entry[3] for entry in entries])
+        located = []
+        for entry in entries:
+            row_number = row_numbers[entry[3]]
+            if not row_number:
+                print(f"❌ Product with ID {entry[3]} not found in sheet {sheet_name}.")
+            located.append((entry, row_number))
+        return located
+
+    def _write(self, cells):
+        """
+        Send every tab's D cells in one batchUpdate. If Google rejects the
+        request outright (e.g. a tab no longer exists), send each tab on its
+        own so the others still go through. Returns [(entries, error)].
+        """
+        if not cells:
+            return []
+
+        def send(tabs):
+            sheets_client.execute(sheets_client.service().spreadsheets().values().batchUpdate(
+                spreadsheetId=SPREADSHEET_ID,
+                body={"valueInputOption": "RAW", "data": [
+                    {"range": f"{sheet_name}!D{row_number}", "values": [[str(entry[4])]]}
+                    for sheet_name in tabs for entry, row_number in cells[sheet_name]
+                ]}
+            ))
+
+        try:
+            send(list(cells))
+            return []
+        except Exception as e:
+            if _retryable(e) or isinstance(e, SheetsUnavailable) or len(cells) == 1:
+                return [([entry for entry, _ in found], e) for found in cells.values()]
+
+        failed = []
+        for sheet_name, found in cells.items():
+            try:
+                send([sheet_name])
+            except Exception as e:
+                failed.append(([entry for entry, _ in found], e))
+        return failed
+
+    def _retry_later(self, claimed, error):
+        print(f"❌ Error updating Google Sheet: {error}")
+        now = datetime.utcnow()
+        for update_id, version, sheet_name, identification_number, _, attempts in claimed:
+            attempts += 1
+            if attempts >= SHEET_SYNC_MAX_ATTEMPTS:
+                print(f"❌ Giving up on {sheet_name} {identification_number} after {attempts} attempts")
+                next_attempt_at = SHEET_SYNC_PARKED
+            else:
+                next_attempt_at = now + timedelta(seconds=min(SHEET_SYNC_INTERVAL * (2 ** (attempts - 1)), 900))
+            SheetStockUpdate.query.filter_by(id=update_id, version=version).update({
+                'attempts': attempts,
+                'last_error': str(error)[:1000],
+                'next_attempt_at': next_attempt_at,
+            })
+        db.session.commit()
+
+
+sheet_sync_queue = SheetStockSyncQueue()
+
+
+def enqueue_sheet_stock_update(sheet_name, identification_number, new_stock):
+    sheet_sync_queue.enqueue(sheet_name, identification_number, new_stock)
+
+
+def enqueue_sheet_stock_updates(writes):
+    sheet_sync_queue.enqueue_many(writes)
+
+
+@app.before_request
+def start_sheet_sync_queue():
+    # Picks up rows left behind by a previous worker as soon as we serve traffic
+    sheet_sync_queue.start()
+
+
+@app.route('/admin/sheets-status')
+@login_required
+def sheets_status():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    pending, oldest = db.session.query(
+        db.func.count(SheetStockUpdate.id), db.func.min(SheetStockUpdate.created_at)
+    ).filter(SheetStockUpdate.next_attempt_at < SHEET_SYNC_PARKED).one()
+    parked = SheetStockUpdate.query.filter(SheetStockUpdate.next_attempt_at >= SHEET_SYNC_PARKED).count()
+    return jsonify({
+        'sheets': sheets_client.stats(),
+        'pending_stock_writes': pending,
+        'oldest_pending_write': oldest.isoformat() if oldest else None,
+        'parked_stock_writes': parked,
+    })
+
+
+@app.cli.command("sync-sheet-stock")
+def sync_sheet_stock_command():
+    """Flush pending Google Sheet stock writes now."""
+    written = sheet_sync_queue.flush()
+    print(f"✅ Flushed {written} pending stock cell(s)")
+
+
+
+def _parse_sheet_stock(row):
+    if len(row) <= 3 or row[3] in [None, '', 'null', 'None']:
+        return 0
+    try:
+        return int(row[3])
+    except ValueError:
+        return None  # unreadable cell, always rewrite it
+
+
+def reconcile_sheet_stock(location, report=None):
+    """
+    Push DB stock to one tab, writing only the cells that differ.
+
+    Reads the tab once, compares it with Product.in_stock for the location
+    in a single pass and sends every differing D cell in one
+    values().batchUpdate. A cell is only overwritten while it still holds
+    the stock we last imported; anything else is a sheet edit (e.g. a
+    restock) the next import must pick up, so it is reported as an
+    unimported sheet edit and left alone. The result is stored as a
+    StockDriftReport.
+    """
+    started = time.perf_counter()
+    if report is None:
+        report = StockDriftReport(location=location)
+        db.session.add(report)
+    report.status = 'running'
+    db.session.commit()
+
+    try:
+        result = sheets_client.execute(sheets_client.service().spreadsheets().values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f"{location}!A2:D"
+        ))
+        values = result.get('values', [])
+        sheet_row_index.load(location, values)
+
+        db_stock = {
+            identification_number: (name, in_stock)
+            for identification_number, name, in_stock in db.session.query(
+                Product.identification_number, Product.name, Product.in_stock
+            ).filter(Product.location == location)
+        }
+        imported_stock = dict(db.session.query(
+            SheetRowFingerprint.identification_number, SheetRowFingerprint.in_stock
+        ).filter(SheetRowFingerprint.location == location))
+
+        data = []
+        drift = []
+        seen = set()
+        for row_number, row in enumerate(values, start=2):
+            identification_number = row[1].strip() if len(row) > 1 and row[1] else ''
+            if not identification_number or identification_number in seen or identification_number not in db_stock:
+                continue
+            seen.add(identification_number)
+
+            name, in_stock = db_stock[identification_number]
+            sheet_stock = _parse_sheet_stock(row)
+            if sheet_stock != in_stock:
+                unimported = imported_stock.get(identification_number) != sheet_stock
+                if not unimported:
+                    data.append({"range": f"{location}!D{row_number}", "values": [[str(in_stock)]]})
+                drift.append({
+                    "identification_number": identification_number,
+                    "name": name,
+                    "row": row_number,
+                    "sheet_stock": sheet_stock,
+                    "db_stock": in_stock,
+                    "unimported_sheet_edit": unimported,
+                })
+
+        if data:
+            sheets_client.execute(sheets_client.service().spreadsheets().values().batchUpdate(
+                spreadsheetId=SPREADSHEET_ID,
+                body={"valueInputOption": "RAW", "data": data}
+            ))
+            remember_sheet_stock_writes([
+                (location, d["identification_number"], d["db_stock"])
+                for d in drift if not d["unimported_sheet_edit"]
+            ])
+
+        report.cells_checked = len(seen)
+        report.cells_changed = len(data)
+        report.missing_in_sheet = len(db_stock) - len(seen)
+        report.details = drift
+        report.status = 'succeeded'
+    except Exception as e:
+        db.session.rollback()
+        report.status = 'failed'
+        report.error = str(e)
+        print(f"❌ Reconciliation failed for {location}: {e}")
+
+    report.seconds = round(time.perf_counter() - started, 3)
+    report.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    if report.status == 'succeeded':
+        print(f"✅ Reconciled {location}: {report.cells_changed} of {report.cells_checked} cell(s) rewritten")
+    return report
+
+
+def reconcile_locations():
+    """Every sheet tab that matches a seller location."""
+    seller_locations = {
+        (location or '').lower()
+        for (location,) in db.session.query(User.location).filter(User.role == 'seller').distinct()
+    }
+    return [title for title in get_sheet_titles(refresh=True) if title.lower() in seller_locations]
+
+
+def run_reconcile_job(report_ids):
+    with app.app_context():
+        for report_id in report_ids:
+            report = db.session.get(StockDriftReport, report_id)
+            if report is not None:
+                reconcile_sheet_stock(report.location, report)
+
+
+@app.route('/admin/reconcile-sheets', methods=['POST'])
+@login_required
+def reconcile_sheets():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    location = (request.form.get('location') or (request.get_json(silent=True) or {}).get('location') or '').strip()
+    try:
+        locations = [location] if location and location != ALL_LOCATIONS else reconcile_locations()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+
+    reports = [StockDriftReport(location=loc) for loc in locations]
+    db.session.add_all(reports)
+    db.session.commit()
+    submit_background(run_reconcile_job, [report.id for report in reports])
+
+    return jsonify({'reports': [report.to_dict() for report in reports]}), 202
+
+
+@app.route('/admin/stock-drift-reports')
+@login_required
+def stock_drift_reports():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    query = StockDriftReport.query
+    location = request.args.get('location')
+    if location:
+        query = query.filter(StockDriftReport.location == location)
+    reports = query.order_by(StockDriftReport.id.desc()).limit(request.args.get('limit', 20, type=int)).all()
+    return jsonify([report.to_dict() for report in reports])
+
+
+@app.cli.command("reconcile-sheets")
+@click.option("--location", default=ALL_LOCATIONS, help="Tab to reconcile (default: every location).")
+def reconcile_sheets_command(location):
+    """Write DB stock back to the sheet wherever the two disagree."""
+    locations = reconcile_locations() if location == ALL_LOCATIONS else [location]
+    failed = False
+    for loc in locations:
+        report = reconcile_sheet_stock(loc)
+        failed = failed or report.status == 'failed'
+        for item in report.details or []:
+            if item.get('unimported_sheet_edit'):
+                print(f"   {loc} {item['identification_number']} ({item['name']}): sheet {item['sheet_stock']} "
+                      f"not imported yet, left as is (DB {item['db_stock']})")
+            else:
+                print(f"   {loc} {item['identification_number']} ({item['name']}): sheet {item['sheet_stock']} -> {item['db_stock']}")
+    if failed:
+        raise SystemExit(1)
+
+
+
+
+@app.route('/delete_product/<int:product_id>', methods=['POST'])
+def delete_product(product_id):
+    product = Product.query.get(product_id)
+    if product:
         try:
             # Delete all associated inventory
             inventories = Inventory.query.filter_by(product_id=product.id).all()
             for inv in inventories:
                 db.session.delete(inv)
 
-            # Delete all associated orders
-            orders = Order.query.filter_by(product_id=product.id).all()
-            for order in orders:
-                db.session.delete(order)
+            # Delete all associated orders
+            orders = Order.query.filter_by(product_id=product.id).all()
+            for order in orders:
+                db.session.delete(order)
+
+            # Finally, delete the product; the ledger keeps its key, not its id
+            record_stock_movement('deletion', product.location, product.identification_number, -product.in_stock, 0,
+                                  admin_id=current_user.id if current_user.is_authenticated else None,
+                                  reason='Product deleted')
+            db.session.delete(product)
+            forget_sheet_fingerprints(product.location)
+            db.session.commit()
+
+            flash('Product successfully deleted!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error deleting product: {str(e)}', 'danger')
+    else:
+        flash('Product not found!', 'danger')
+
+    return redirect(url_for('admin_dashboard'))
+
+
+import base64
+from sqlalchemy import func, tuple_
+
+ORDERS_PAGE_SIZE = 50
+ORDER_SORT_COLUMNS = {
+    'date_sold': Order.date_sold,
+    'amount': func.coalesce(Order.amount, 0),
+    'quantity': Order.quantity,
+}
+
+
+def date_range_filters(column, start_date_str='', end_date_str=''):
+    """SQL filters for an inclusive YYYY-MM-DD date range on a DateTime column."""
+    filters = []
+    if start_date_str:
+        filters.append(column >= datetime.strptime(start_date_str, '%Y-%m-%d'))
+    if end_date_str:
+        filters.append(column < datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1))
+    return filters
+
+
+def drop_invalid_dates(filters, *fields):
+    """Blank out (and flash about) filter dates that are not YYYY-MM-DD, so the page still renders."""
+    for field in fields:
+        try:
+            if filters[field]:
+                datetime.strptime(filters[field], '%Y-%m-%d')
+        except ValueError:
+            flash(f"Ignored {field.replace('_', ' ')} \"{filters[field]}\": dates must be YYYY-MM-DD.", "warning")
+            filters[field] = ''
+    return filters
+
+
+def _order_filters(start_date='', end_date='', location=''):
+    filters = date_range_filters(Order.date_sold, start_date, end_date)
+    if location:
+        filters.append(Order.location.ilike(f"%{location}%"))
+    return filters
+
+
+def _encode_cursor(value, order_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, order_id]).encode()).decode()
+
+
+def _decode_cursor(cursor, sort):
+    value, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if sort == 'date_sold':
+        value = datetime.fromisoformat(value)
+    return value, int(order_id)
+
+
+def orders_page(start_date='', end_date='', location='', sort='date_sold', direction='desc', cursor='', limit=ORDERS_PAGE_SIZE):
+    """
+    One page of orders with product and seller names from a single joined query.
+
+    Pages are keyset-paginated on (sort column, id), so page N costs the
+    same as page 1. Returns (rows, cursor for the next page or None).
+    """
+    sort = sort if sort in ORDER_SORT_COLUMNS else 'date_sold'
+    sort_column = ORDER_SORT_COLUMNS[sort]
+    descending = direction != 'asc'
+    limit = max(1, min(limit or ORDERS_PAGE_SIZE, 200))
+
+    query = db.session.query(
+        Order.id, Order.product_id, Order.quantity, Order.selling_price, Order.amount,
+        Order.location, Order.date_sold, sort_column.label('sort_value'),
+        Product.name.label('product_name'), Product.identification_number,
+        Product.in_stock.label('product_in_stock'), User.username.label('seller_name')
+    ).outerjoin(Product, Product.id == Order.product_id).outerjoin(User, User.id == Order.seller_id)
+    query = query.filter(*_order_filters(start_date, end_date, location))
+
+    if cursor:
+        try:
+            value, order_id = _decode_cursor(cursor, sort)
+        except (ValueError, TypeError):
+            value = None
+        if value is not None:
+            key = tuple_(sort_column, Order.id)
+            query = query.filter(key < tuple_(value, order_id) if descending else key > tuple_(value, order_id))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), Order.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Order.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].sort_value, rows[-1].id)
+    return rows, next_cursor
+
+
+# -----------------------------
+# Financial summary (per location and day)
+# -----------------------------
+from sqlalchemy import select, literal
+from datetime import date
+
+
+def _day_of(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.utcnow().date()
+
+
+def _sql_date(value):
+    # func.date() returns a string on SQLite and a date on Postgres
+    return date.fromisoformat(value) if isinstance(value, str) else _day_of(value)
+
+
+def _order_bucket(location, date_sold, amount):
+    return (location or '', _day_of(date_sold)), (float(amount or 0), 1, 0.0, 0.0)
+
+
+def _bakery_bucket(location, date_sent, purchase_cost, usage_cost):
+    return (location or '', _day_of(date_sent)), (0.0, 0, float(purchase_cost or 0), float(usage_cost or 0))
+
+
+def _sales_bucket(location, product_id, seller_id, date_sold, quantity, amount):
+    return (location or '', product_id, seller_id, _day_of(date_sold)), (int(quantity or 0), float(amount or 0), 1)
+
+
+def _collect_summary_deltas(session):
+    """
+    Net change per financial_summary and daily_sales_rollup bucket caused
+    by the pending flush, as (financial deltas, sales deltas).
+
+    Old values of changed or deleted rows are read back from the database,
+    which still holds them at this point.
+    """
+    deltas = defaultdict(lambda: [0.0, 0, 0.0, 0.0])
+    sales_deltas = defaultdict(lambda: [0, 0.0, 0])
+    connection = session.connection()
+    seller_locations = {}
+
+    def seller_location(seller_id):
+        if seller_id not in seller_locations:
+            seller_locations[seller_id] = connection.execute(
+                select(User.location).where(User.id == seller_id)
+            ).scalar()
+        return seller_locations[seller_id]
+
+    def add(bucket, sign, target=deltas):
+        key, values = bucket
+        for i, value in enumerate(values):
+            target[key][i] += sign * value
+
+    def add_order(location, product_id, seller_id, date_sold, quantity, amount, sign):
+        add(_order_bucket(location, date_sold, amount), sign)
+        add(_sales_bucket(location, product_id, seller_id, date_sold, quantity, amount), sign, sales_deltas)
+
+    def stored_order(order_id):
+        row = connection.execute(
+            select(
+                Order.location, Order.product_id, Order.seller_id, Order.date_sold, Order.quantity, Order.amount
+            ).where(Order.id == order_id)
+        ).first()
+        if row:
+            add_order(row.location, row.product_id, row.seller_id, row.date_sold, row.quantity, row.amount, -1)
+
+    def stored_bakery(inventory_id):
+        row = connection.execute(
+            select(
+                BakerInventory.seller_id, BakerInventory.date_sent,
+                BakerInventory.purchase_cost_total, BakerInventory.usage_cost_total
+            ).where(BakerInventory.id == inventory_id, BakerInventory.status == 'approved')
+        ).first()
+        if row:
+            add(_bakery_bucket(
+                seller_location(row.seller_id), row.date_sent, row.purchase_cost_total, row.usage_cost_total
+            ), -1)
+
+    def current(obj):
+        if isinstance(obj, Order):
+            add_order(obj.location, obj.product_id, obj.seller_id, obj.date_sold, obj.quantity, obj.amount, 1)
+        elif obj.status == 'approved':
+            obj.update_cost_totals()  # before_insert/before_update have not run yet
+            add(_bakery_bucket(
+                seller_location(obj.seller_id), obj.date_sent, obj.purchase_cost_total, obj.usage_cost_total
+            ), 1)
+
+    tracked = (Order, BakerInventory)
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, tracked):
+                current(obj)
+
+        for obj in session.deleted:
+            if isinstance(obj, Order):
+                stored_order(obj.id)
+            elif isinstance(obj, BakerInventory):
+                stored_bakery(obj.id)
+
+        for obj in session.dirty:
+            if not isinstance(obj, tracked) or not session.is_modified(obj, include_collections=False):
+                continue
+            if isinstance(obj, Order):
+                stored_order(obj.id)
+            else:
+                stored_bakery(obj.id)
+            current(obj)
+
+    return (
+        {key: values for key, values in deltas.items() if any(values)},
+        {key: values for key, values in sales_deltas.items() if any(values)},
+    )
+
 
-            # Finally, delete the product
-            db.session.delete(product)
-            db.session.commit()
+def apply_financial_deltas(connection, deltas):
+    """Add per-bucket deltas to financial_summary with one upsert per bucket."""
+    now = datetime.utcnow()
+    table = FinancialSummary.__table__
+    for (location, day), (sales, orders, purchase, usage) in deltas.items():
+        stmt = insert_on_conflict(FinancialSummary).values(
+            location=location, day=day, sales_total=sales, order_count=orders,
+            purchase_cost=purchase, usage_cost=usage, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['location', 'day'],
+            set_={
+                'sales_total': table.c.sales_total + stmt.excluded.sales_total,
+                'order_count': table.c.order_count + stmt.excluded.order_count,
+                'purchase_cost': table.c.purchase_cost + stmt.excluded.purchase_cost,
+                'usage_cost': table.c.usage_cost + stmt.excluded.usage_cost,
+                'updated_at': now,
+            }
+        )
+        connection.execute(stmt)
 
-            flash('Product successfully deleted!', 'success')
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error deleting product: {str(e)}', 'danger')
-    else:
-        flash('Product not found!', 'danger')
 
-    return redirect(url_for('admin_dashboard'))
+def apply_sales_rollup_deltas(connection, deltas):
+    """Add per-bucket deltas to daily_sales_rollup with one upsert per bucket."""
+    table = DailySalesRollup.__table__
+    for (location, product_id, seller_id, day), (quantity, amount, orders) in deltas.items():
+        stmt = insert_on_conflict(DailySalesRollup).values(
+            location=location, product_id=product_id, seller_id=seller_id, day=day,
+            quantity=quantity, amount=amount, order_count=orders
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['location', 'product_id', 'seller_id', 'day'],
+            set_={
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'amount': table.c.amount + stmt.excluded.amount,
+                'order_count': table.c.order_count + stmt.excluded.order_count,
+            }
+        )
+        connection.execute(stmt)
+
+        if orders < 0:
+            # Drop buckets whose last order was removed
+            connection.execute(table.delete().where(
+                table.c.location == location, table.c.product_id == product_id,
+                table.c.seller_id == seller_id, table.c.day == day, table.c.order_count <= 0
+            ))
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_financial_summary_changes(session, flush_context, instances):
+    financial, sales = _collect_summary_deltas(session)
+    for name, deltas in (('financial_deltas', financial), ('sales_deltas', sales)):
+        pending = session.info.setdefault(name, {})
+        for key, values in deltas.items():
+            totals = pending.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                totals[i] += value
+
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_financial_summary(session, flush_context):
+    """
+    Keep financial_summary and daily_sales_rollup in step with Order
+    inserts/deletes and baker submissions entering or leaving 'approved'.
+
+    Runs inside the flushing transaction, so the summaries commit or roll
+    back with the change that caused them. Bulk Query.delete() bypasses the
+    session; callers that use it must call withdraw_from_summaries() for
+    the rows first, in the same transaction.
+    """
+    deltas = session.info.pop('financial_deltas', None)
+    if deltas:
+        apply_financial_deltas(session.connection(), deltas)
+    deltas = session.info.pop('sales_deltas', None)
+    if deltas:
+        apply_sales_rollup_deltas(session.connection(), deltas)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_financial_summary_changes(session):
+    session.info.pop('financial_deltas', None)
+    session.info.pop('sales_deltas', None)
+
+
+def _financial_buckets(order_filters=(), bakery_filters=()):
+    """
+    financial_summary buckets for the orders and approved submissions
+    matching the filters; None skips that source.
+    """
+    deltas = defaultdict(lambda: [0.0, 0, 0.0, 0.0])
+
+    if order_filters is not None:
+        order_rows = db.session.query(
+            Order.location, func.date(Order.date_sold), func.coalesce(func.sum(Order.amount), 0), func.count(Order.id)
+        ).filter(*order_filters).group_by(Order.location, func.date(Order.date_sold)).all()
+        for location, day, sales, count in order_rows:
+            bucket = deltas[(location or '', _sql_date(day))]
+            bucket[0] += float(sales or 0)
+            bucket[1] += count
+
+    if bakery_filters is not None:
+        day_sent = func.date(BakerInventory.date_sent)
+        bakery_rows = db.session.query(
+            User.location, day_sent,
+            func.coalesce(func.sum(BakerInventory.purchase_cost_total), 0),
+            func.coalesce(func.sum(BakerInventory.usage_cost_total), 0)
+        ).outerjoin(User, User.id == BakerInventory.seller_id).filter(
+            BakerInventory.status == 'approved', *bakery_filters
+        ).group_by(User.location, day_sent).all()
+        for location, day, purchase, usage in bakery_rows:
+            bucket = deltas[(location or '', _sql_date(day))]
+            bucket[2] += float(purchase or 0)
+            bucket[3] += float(usage or 0)
+
+    return deltas
+
+
+def _sales_buckets(order_filters=()):
+    """daily_sales_rollup buckets for the orders matching the filters, from one GROUP BY."""
+    day_sold = func.date(Order.date_sold)
+    rows = db.session.query(
+        Order.location, Order.product_id, Order.seller_id, day_sold,
+        func.coalesce(func.sum(Order.quantity), 0), func.coalesce(func.sum(Order.amount), 0), func.count(Order.id)
+    ).filter(*order_filters).group_by(Order.location, Order.product_id, Order.seller_id, day_sold).all()
+
+    # Two NULL/'' locations on the same day collapse into one bucket
+    buckets = defaultdict(lambda: [0, 0.0, 0])
+    for location, product_id, seller_id, day, quantity, amount, orders in rows:
+        bucket = buckets[(location or '', product_id, seller_id, _sql_date(day))]
+        bucket[0] += int(quantity or 0)
+        bucket[1] += float(amount or 0)
+        bucket[2] += orders
+    return buckets
+
+
+def withdraw_from_summaries(order_filters=None, bakery_filters=None):
+    """
+    Subtract the orders and approved submissions about to be removed by a
+    bulk Query.delete() from financial_summary and daily_sales_rollup.
+    Call it before the delete; it runs in the caller's transaction, so the
+    summaries commit or roll back with the delete. None skips that source.
+    """
+    connection = db.session.connection()
+    financial = _financial_buckets(order_filters, bakery_filters)
+    apply_financial_deltas(connection, {
+        key: [-value for value in values] for key, values in financial.items()
+    })
+    if order_filters is not None:
+        apply_sales_rollup_deltas(connection, {
+            key: [-value for value in values] for key, values in _sales_buckets(order_filters).items()
+        })
+
+
+def rebuild_financial_summary():
+    """Recompute every (location, day) bucket from orders and approved submissions."""
+    deltas = _financial_buckets()
+
+    db.session.query(FinancialSummary).delete()
+    db.session.bulk_insert_mappings(FinancialSummary, [
+        {
+            'location': location, 'day': day, 'sales_total': sales, 'order_count': orders,
+            'purchase_cost': purchase, 'usage_cost': usage, 'updated_at': datetime.utcnow()
+        }
+        for (location, day), (sales, orders, purchase, usage) in deltas.items()
+    ])
+    db.session.commit()
+    return len(deltas)
+
+
+def _summary_filters(model, location='', start_date='', end_date=''):
+    """Filters for a summary table with `location` and `day` columns."""
+    filters = []
+    if location:
+        filters.append(model.location.ilike(f"%{location}%"))
+    if start_date:
+        filters.append(model.day >= datetime.strptime(start_date, '%Y-%m-%d').date())
+    if end_date:
+        filters.append(model.day <= datetime.strptime(end_date, '%Y-%m-%d').date())
+    return filters
+
+
+def financial_totals(location='', start_date='', end_date=''):
+    """
+    Sales, order count and baker costs summed from financial_summary.
+
+    `location` matches like the order filters (case-insensitive substring);
+    dates are inclusive YYYY-MM-DD strings.
+    """
+    query = db.session.query(
+        func.coalesce(func.sum(FinancialSummary.sales_total), 0),
+        func.coalesce(func.sum(FinancialSummary.order_count), 0),
+        func.coalesce(func.sum(FinancialSummary.purchase_cost), 0),
+        func.coalesce(func.sum(FinancialSummary.usage_cost), 0),
+    )
+    query = query.filter(*_summary_filters(FinancialSummary, location, start_date, end_date))
+
+    sales, orders, purchase, usage = query.one()
+    return {
+        'total_sales': float(sales or 0),
+        'order_count': int(orders or 0),
+        'total_purchase_cost': float(purchase or 0),
+        'total_usage_cost': float(usage or 0),
+    }
+
+
+@app.cli.command("rebuild-financial-summary")
+def rebuild_financial_summary_command():
+    """Recompute the financial summary table from full history."""
+    buckets = rebuild_financial_summary()
+    print(f"✅ Financial summary rebuilt: {buckets} location/day bucket(s)")
+
+
+def rebuild_daily_sales_rollup():
+    """Recompute daily_sales_rollup from every order with one GROUP BY."""
+    buckets = _sales_buckets()
+
+    db.session.query(DailySalesRollup).delete()
+    db.session.bulk_insert_mappings(DailySalesRollup, [
+        {
+            'location': location, 'product_id': product_id, 'seller_id': seller_id, 'day': day,
+            'quantity': quantity, 'amount': amount, 'order_count': orders
+        }
+        for (location, product_id, seller_id, day), (quantity, amount, orders) in buckets.items()
+    ])
+    db.session.commit()
+    return len(buckets)
+
+
+@app.cli.command("rebuild-sales-rollup")
+def rebuild_sales_rollup_command():
+    """Recompute the daily sales rollup behind the order charts."""
+    buckets = rebuild_daily_sales_rollup()
+    print(f"✅ Daily sales rollup rebuilt: {buckets} bucket(s)")
 
 
 @app.route('/admin', methods=['GET', 'POST'])
@@ -671,56 +2631,9 @@ def admin_dashboard():
             return redirect(url_for('admin_dashboard'))
 
         try:
-            sheet_data = get_google_sheet_data_by_location(location)
-            if not sheet_data:
-                flash(f"No data found for location {location}.", "danger")
-                return redirect(url_for('admin_dashboard'))
-
-            for row in sheet_data:
-                name = row.get('name', '').strip()
-                identification_number = row.get('identification_number', '').strip()
-                price = float(row.get('price', 0.0))
-                in_stock = int(row.get('in_stock', 0))
-
-                if not name or not identification_number:
-                    continue  # skip incomplete rows
-
-                existing_product = Product.query.filter_by(
-                    identification_number=identification_number
-                ).first()
-
-                if existing_product:
-                    continue  # skip duplicate
-
-                product = Product(
-                    name=name,
-                    identification_number=identification_number,
-                    price=price,
-                    selling_price=None,
-                    location=location
-                )
-                db.session.add(product)
-                db.session.commit()
-
-                sellers = User.query.filter(
-                    User.location.ilike(f"%{location}%"),
-                    User.role == 'seller'
-                ).all()
-
-                if not sellers:
-                    flash(f"No sellers found for location: {location}", "warning")
-                    continue
-
-                for seller in sellers:
-                    inventory = Inventory(
-                        product_id=product.id,
-                        seller_id=seller.id,
-                        quantity_in_stock=10 if in_stock else 0
-                    )
-                    db.session.add(inventory)
-
-            db.session.commit()
-            flash(f"Successfully imported data for location {location}!", "success")
+            job = queue_import_job(location)
+            flash(f"Import for {import_location_label(location)} started (job #{job.id}).", "success")
+            return redirect(url_for('admin_dashboard', import_job=job.id))
 
         except Exception as e:
             flash(f"An error occurred while importing data: {str(e)}", "danger")
@@ -732,44 +2645,67 @@ def admin_dashboard():
     else:
         products = Product.query.all()
 
-    inventories = {inv.product_id: inv for inv in Inventory.query.all()}
-    orders = Order.query.all()
+    # -----------------------------
+    # Orders (one joined query, keyset paginated)
+    # -----------------------------
+    order_filters = drop_invalid_dates({
+        'order_start': request.args.get('order_start', '').strip(),
+        'order_end': request.args.get('order_end', '').strip(),
+        'order_location': request.args.get('order_location', '').strip(),
+        'order_sort': request.args.get('order_sort', 'date_sold'),
+        'order_dir': request.args.get('order_dir', 'desc'),
+    }, 'order_start', 'order_end')
+    order_rows, next_cursor = orders_page(
+        start_date=order_filters['order_start'],
+        end_date=order_filters['order_end'],
+        location=order_filters['order_location'],
+        sort=order_filters['order_sort'],
+        direction=order_filters['order_dir'],
+        cursor=request.args.get('order_after', ''),
+        limit=request.args.get('order_limit', ORDERS_PAGE_SIZE, type=int)
+    )
+
+    # Inventory only for the products on this page of orders
+    page_product_ids = {row.product_id for row in order_rows}
+    inventories = {
+        inv.product_id: inv
+        for inv in Inventory.query.filter(Inventory.product_id.in_(page_product_ids)).order_by(Inventory.id)
+    } if page_product_ids else {}
 
     # -----------------------------
     # Prepare orders for profit/loss
     # -----------------------------
     order_list = []
-    for order in orders:
-        product = Product.query.get(order.product_id)
-        purchase_cost = getattr(product, 'purchase_cost', 0)  # cost to buy
-        usage_cost = getattr(product, 'usage_cost', 0)       # other expenses
+    for row in order_rows:
+        inventory = inventories.get(row.product_id)
         order_list.append({
-            "product_name": product.name if product else "Unknown",
-            "identification_number": product.identification_number if product else "N/A",
-            "in_stock": inventories.get(product.id).quantity_in_stock if product and inventories.get(product.id) else 0,
-            "quantity_sold": order.quantity,
-            "selling_price": order.selling_price,
-            "amount": order.amount or 0,
-            "purchase_cost": purchase_cost,
-            "usage_cost": usage_cost,
-            "profit_loss": (order.amount or 0) - (purchase_cost + usage_cost),
-            "seller": order.seller.username if order.seller else "Unknown",
-            "location": getattr(order, "location", "N/A"),
-            "date_sold": getattr(order, "date_sold", None),
+            "id": row.id,
+            "product_name": row.product_name or "Unknown",
+            "identification_number": row.identification_number or "N/A",
+            "in_stock": inventory.quantity_in_stock if inventory else 0,
+            "quantity_sold": row.quantity,
+            "selling_price": row.selling_price,
+            "amount": row.amount or 0,
+            "purchase_cost": 0,  # products carry no cost data yet
+            "usage_cost": 0,
+            "profit_loss": row.amount or 0,
+            "seller": row.seller_name or "Unknown",
+            "location": row.location or "N/A",
+            "date_sold": row.date_sold,
         })
 
     # -----------------------------
     # Financial summary
     # -----------------------------
-    bakeries = BakerInventory.query.filter_by(status='approved').all()
-
-    # fallback if model has no methods yet
-    def safe_attr(obj, attr, default=0):
-        return getattr(obj, attr, default) or 0
-
-    total_purchase_cost = sum(safe_attr(b, "total_purchase_cost") for b in bakeries)
-    total_usage_cost = sum(safe_attr(b, "total_usage_cost") for b in bakeries)
-    total_sales = sum(order["amount"] for order in order_list)
+    # Sales and costs share the order filters, so profit/loss covers one scope
+    totals = financial_totals(
+        location=order_filters['order_location'],
+        start_date=order_filters['order_start'],
+        end_date=order_filters['order_end']
+    )
+    total_purchase_cost = totals['total_purchase_cost']
+    total_usage_cost = totals['total_usage_cost']
+    total_sales, order_count = totals['total_sales'], totals['order_count']
     profit_loss = total_sales - (total_purchase_cost + total_usage_cost)
 
     admins = User.query.filter_by(role='admin').all()
@@ -780,10 +2716,14 @@ def admin_dashboard():
         products=products,
         inventories=inventories,
         orders=order_list,
+        order_filters=order_filters,
+        next_order_cursor=next_cursor,
+        order_count=order_count,
         user_role='admin',
         search_query=search_query,
         admins=admins,
         admin_name=admin_name,
+        import_job_id=request.args.get('import_job', type=int),
 
         # ✅ pass summary values to template
         total_sales=total_sales,
@@ -1095,6 +3035,384 @@ def logout():
 
 
 
+STOCK_SNAPSHOT_LAG = int(os.getenv("STOCK_SNAPSHOT_LAG", "300"))  # seconds; newer ledger rows wait for the next snapshot
+
+
+def record_stock_movement(kind, location, identification_number, change, balance_after,
+                          product_id=None, seller_id=None, admin_id=None, reason=None):
+    """
+    Queue one stock_history ledger row in the current transaction.
+
+    Rows are buffered on the session and written with a single executemany
+    just before the outer transaction commits; rows queued inside a
+    savepoint that is rolled back are dropped with it.
+    """
+    if not change:
+        return
+    session = db.session()
+    session.info.setdefault('stock_ledger', []).append((session.get_nested_transaction(), {
+        'kind': kind,
+        'location': location,
+        'identification_number': identification_number,
+        'change_amount': change,
+        'balance_after': balance_after,
+        'product_id': product_id,
+        'seller_id': seller_id,
+        'admin_id': admin_id,
+        'reason': reason,
+        'created_at': datetime.utcnow(),
+    }))
+
+
+def _inside(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(db.session, 'before_commit')
+def write_stock_ledger(session):
+    if session.in_nested_transaction():
+        return  # releasing a savepoint; the rows wait for the outer commit
+    pending = session.info.pop('stock_ledger', None)
+    if pending:
+        session.execute(insert(StockHistory.__table__), [row for _, row in pending])
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_stock_ledger(session, previous_transaction):
+    pending = session.info.get('stock_ledger')
+    if pending and previous_transaction.nested:
+        session.info['stock_ledger'] = [
+            (transaction, row) for transaction, row in pending
+            if not _inside(transaction, previous_transaction)
+        ]
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def forget_stock_ledger(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('stock_ledger', None)
+
+
+def _ledger_key_filters(model, location='', identification_number=''):
+    filters = []
+    if location:
+        filters.append(model.location == location)
+    if identification_number:
+        filters.append(model.identification_number == identification_number)
+    return filters
+
+
+def _stock_states_at(at, location='', identification_number=''):
+    """
+    Stock and cumulative units in/out per (location, identification_number)
+    as of `at`: the latest snapshot at or before `at`, replayed forward with
+    the ledger rows written since that snapshot run.
+
+    Returns ({key: [in_stock, units_in, units_out]}, keys touched by the tail).
+    """
+    snapshot_at = db.session.query(func.max(StockSnapshot.taken_at)).filter(StockSnapshot.taken_at <= at).scalar()
+
+    states = {}
+    if snapshot_at is not None:
+        latest = db.session.query(
+            StockSnapshot.location, StockSnapshot.identification_number,
+            func.max(StockSnapshot.taken_at).label('taken_at')
+        ).filter(
+            StockSnapshot.taken_at <= at, *_ledger_key_filters(StockSnapshot, location, identification_number)
+        ).group_by(StockSnapshot.location, StockSnapshot.identification_number).subquery()
+        rows = db.session.query(
+            StockSnapshot.location, StockSnapshot.identification_number,
+            StockSnapshot.in_stock, StockSnapshot.units_in, StockSnapshot.units_out
+        ).join(latest, (StockSnapshot.location == latest.c.location)
+               & (StockSnapshot.identification_number == latest.c.identification_number)
+               & (StockSnapshot.taken_at == latest.c.taken_at))
+        for row in rows:
+            states[(row.location, row.identification_number)] = [row.in_stock, row.units_in, row.units_out]
+
+    tail = db.session.query(
+        StockHistory.location, StockHistory.identification_number,
+        StockHistory.change_amount, StockHistory.balance_after
+    ).filter(
+        StockHistory.created_at <= at,
+        StockHistory.identification_number.isnot(None),
+        *_ledger_key_filters(StockHistory, location, identification_number)
+    )
+    if snapshot_at is not None:
+        tail = tail.filter(StockHistory.created_at > snapshot_at)
+
+    touched = set()
+    for row in tail.order_by(StockHistory.created_at, StockHistory.id):
+        key = (row.location, row.identification_number)
+        state = states.setdefault(key, [0, 0, 0])
+        state[0] = row.balance_after
+        if row.change_amount > 0:
+            state[1] += row.change_amount
+        else:
+            state[2] -= row.change_amount
+        touched.add(key)
+    return states, touched
+
+
+def stock_at(at, location='', identification_number=''):
+    """Stock per product at a point in time, from the nearest snapshot plus the ledger tail."""
+    states, _ = _stock_states_at(at, location, identification_number)
+    return [
+        {'location': key[0], 'identification_number': key[1], 'in_stock': state[0]}
+        for key, state in sorted(states.items())
+    ]
+
+
+def stock_movements(start, end, location='', identification_number=''):
+    """Opening stock, units in/out and closing stock per product between two points in time."""
+    opening, _ = _stock_states_at(start, location, identification_number)
+    closing, _ = _stock_states_at(end, location, identification_number)
+
+    movements = []
+    for key, (in_stock, units_in, units_out) in sorted(closing.items()):
+        before = opening.get(key)
+        received = units_in - (before[1] if before else 0)
+        removed = units_out - (before[2] if before else 0)
+        if not received and not removed:
+            continue
+        movements.append({
+            'location': key[0],
+            'identification_number': key[1],
+            'opening_stock': before[0] if before else None,
+            'units_in': received,
+            'units_out': removed,
+            'net_change': received - removed,
+            'closing_stock': in_stock,
+        })
+    return movements
+
+
+def snapshot_stock(now=None):
+    """
+    Compact the ledger into stock_snapshot rows as of now - STOCK_SNAPSHOT_LAG.
+
+    Only products with ledger rows since the previous run get a new row,
+    plus a one-off baseline from Product.in_stock for products the ledger
+    has never seen. The lag leaves room for transactions still in flight,
+    whose rows are stamped before they commit. Returns the rows written.
+    """
+    taken_at = (now or datetime.utcnow()) - timedelta(seconds=STOCK_SNAPSHOT_LAG)
+    last_taken = db.session.query(func.max(StockSnapshot.taken_at)).scalar()
+    if last_taken is not None and last_taken >= taken_at:
+        return 0
+
+    states, touched = _stock_states_at(taken_at)
+    rows = [
+        {'location': key[0], 'identification_number': key[1], 'taken_at': taken_at,
+         'in_stock': states[key][0], 'units_in': states[key][1], 'units_out': states[key][2]}
+        for key in sorted(touched)
+    ]
+
+    # Baseline: current stock minus whatever the ledger moved after taken_at
+    later = dict(
+        ((row.location, row.identification_number), row.net)
+        for row in db.session.query(
+            StockHistory.location, StockHistory.identification_number,
+            func.sum(StockHistory.change_amount).label('net')
+        ).filter(
+            StockHistory.created_at > taken_at, StockHistory.identification_number.isnot(None)
+        ).group_by(StockHistory.location, StockHistory.identification_number)
+    )
+    for product in db.session.query(Product.location, Product.identification_number, Product.in_stock):
+        key = (product.location, product.identification_number)
+        if key in states:
+            continue
+        rows.append({'location': key[0], 'identification_number': key[1], 'taken_at': taken_at,
+                     'in_stock': product.in_stock - (later.get(key) or 0), 'units_in': 0, 'units_out': 0})
+
+    if rows:
+        db.session.execute(insert(StockSnapshot.__table__), rows)
+    db.session.commit()
+    return len(rows)
+
+
+@app.cli.command("snapshot-stock")
+def snapshot_stock_command():
+    """Compact the stock ledger into per-product snapshots (run from cron)."""
+    written = snapshot_stock()
+    print(f"✅ Stock snapshot written for {written} product(s)")
+
+
+def _parse_stock_time(value, default=None):
+    value = (value or '').strip()
+    if not value:
+        if default is None:
+            raise ValueError("time is required")
+        return default
+    return datetime.fromisoformat(value)
+
+
+@app.route('/admin/stock/at')
+@login_required
+def stock_at_api():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    try:
+        at = _parse_stock_time(request.args.get('at'), default=datetime.utcnow())
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Time must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]'}), 400
+    products = stock_at(
+        at,
+        location=request.args.get('location', '').strip(),
+        identification_number=request.args.get('identification_number', '').strip()
+    )
+    return jsonify({'success': True, 'at': at.isoformat(), 'products': products})
+
+
+@app.route('/admin/stock/movements')
+@login_required
+def stock_movements_api():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    try:
+        start = _parse_stock_time(request.args.get('start'))
+        end = _parse_stock_time(request.args.get('end'), default=datetime.utcnow())
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]'}), 400
+    if end < start:
+        return jsonify({'success': False, 'error': 'end must not be before start'}), 400
+
+    movements = stock_movements(
+        start, end,
+        location=request.args.get('location', '').strip(),
+        identification_number=request.args.get('identification_number', '').strip()
+    )
+    return jsonify({'success': True, 'start': start.isoformat(), 'end': end.isoformat(), 'movements': movements})
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def reserve_stock(product_id, quantity, seller_id=None, require_inventory=False):
+    """
+    Take `quantity` units off a product, and off the seller's inventory row
+    when `seller_id` is given, with conditional UPDATE ... RETURNING
+    statements in the current transaction.
+
+    The stock check and the decrement are one statement, so concurrent
+    sales cannot oversell and no row is locked for longer than the
+    caller's transaction. Raises OutOfStock or LookupError; the caller
+    must roll back in that case (an earlier decrement may already have
+    run) and commit together with its Order insert otherwise.
+    """
+    product_table = Product.__table__
+    row = db.session.execute(
+        update(product_table)
+        .where(product_table.c.id == product_id, product_table.c.in_stock >= quantity)
+        .values(in_stock=product_table.c.in_stock - quantity)
+        .returning(product_table.c.in_stock, product_table.c.location, product_table.c.identification_number,
+                   product_table.c.name)
+    ).first()
+    if row is None:
+        if db.session.get(Product, product_id) is None:
+            raise LookupError("Product not found")
+        raise OutOfStock("Not enough stock available")
+    record_stock_movement('sale', row.location, row.identification_number, -quantity, row.in_stock,
+                          product_id=product_id, seller_id=seller_id)
+
+    reserved = {
+        'product_id': product_id,
+        'in_stock': row.in_stock,
+        'location': row.location,
+        'identification_number': row.identification_number,
+        'name': row.name,
+        'inventory_in_stock': None,
+    }
+    if seller_id is None:
+        return reserved
+
+    inventory_table = Inventory.__table__
+    remaining = db.session.execute(
+        update(inventory_table)
+        .where(
+            inventory_table.c.product_id == product_id,
+            inventory_table.c.seller_id == seller_id,
+            inventory_table.c.quantity_in_stock >= quantity
+        )
+        .values(
+            quantity_in_stock=inventory_table.c.quantity_in_stock - quantity,
+            quantity_sold=inventory_table.c.quantity_sold + quantity,
+            in_stock=inventory_table.c.quantity_in_stock - quantity  # admin view mirrors the seller's count
+        )
+        .returning(inventory_table.c.quantity_in_stock)
+    ).scalars().all()
+    if remaining:
+        reserved['inventory_in_stock'] = remaining[0]
+        return reserved
+
+    has_inventory = db.session.query(
+        Inventory.query.filter_by(product_id=product_id, seller_id=seller_id).exists()
+    ).scalar()
+    if has_inventory:
+        raise OutOfStock("Not enough stock available")
+    if require_inventory:
+        raise LookupError("Product or inventory not found")
+    return reserved
+
+
+def adjust_stock(product_id, change, admin_id=None, reason=None):
+    """
+    Add (change > 0) or write off (change < 0) units of a product by hand,
+    recording the adjustment in the ledger. Stock never goes below zero.
+    Raises LookupError or OutOfStock; the caller commits.
+    """
+    product_table = Product.__table__
+    row = db.session.execute(
+        update(product_table)
+        .where(product_table.c.id == product_id, product_table.c.in_stock + change >= 0)
+        .values(in_stock=product_table.c.in_stock + change)
+        .returning(product_table.c.in_stock, product_table.c.location, product_table.c.identification_number)
+    ).first()
+    if row is None:
+        if db.session.get(Product, product_id) is None:
+            raise LookupError("Product not found")
+        raise OutOfStock("Adjustment would take stock below zero")
+
+    record_stock_movement('adjustment', row.location, row.identification_number, change, row.in_stock,
+                          product_id=product_id, admin_id=admin_id, reason=reason)
+    enqueue_sheet_stock_update(row.location, row.identification_number, row.in_stock)
+    return row.in_stock
+
+
+@app.route('/admin/adjust-stock', methods=['POST'])
+@login_required
+def adjust_stock_api():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    try:
+        product_id = int(data.get('product_id'))
+        change = int(data.get('change'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'product_id and change must be whole numbers'}), 400
+    if change == 0:
+        return jsonify({'success': False, 'error': 'change must not be zero'}), 400
+    reason = (data.get('reason') or '').strip()[:255] or None
+
+    try:
+        in_stock = adjust_stock(product_id, change, admin_id=current_user.id, reason=reason)
+        db.session.commit()
+    except LookupError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    except OutOfStock as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'product_id': product_id, 'in_stock': in_stock})
+
+
 @app.route('/order/<int:product_id>', methods=['POST'])
 @login_required
 def place_order(product_id):
@@ -1104,48 +3422,45 @@ def place_order(product_id):
     quantity = int(request.form['quantity'])
     selling_price = float(request.form['selling_price'])
 
-    # Fetch the product and inventory details
-    product = Product.query.get(product_id)
-    inventory = Inventory.query.filter_by(product_id=product_id, seller_id=current_user.id).first()
-
-    if not product or not inventory:
-        flash('Product or inventory not found.', 'danger')
+    if quantity <= 0:
+        flash('Quantity must be at least 1.', 'danger')
         return redirect(url_for('seller_dashboard'))
 
-    # Check if there is enough stock
-    if inventory.quantity_in_stock >= quantity:
-        # Deduct stock from the seller's inventory
-        inventory.quantity_in_stock -= quantity
-        inventory.quantity_sold += quantity
-        db.session.commit()
-
-        # Update global product stock
-        product.in_stock -= quantity
-        db.session.commit()
-        
-        update_google_sheet_stock(product.location, product.identification_number, product.in_stock)
-
-        total_amount = quantity * selling_price
+    try:
+        # Deduct stock from the product and the seller's inventory
+        stock = reserve_stock(product_id, quantity, seller_id=current_user.id, require_inventory=True)
 
-        # Create the new order
+        # Create the new order in the same transaction
         new_order = Order(
             product_id=product_id,
             quantity=quantity,
-            status="completed",
             selling_price=selling_price,
-            amount=total_amount
+            amount=quantity * selling_price,
+            in_stock=stock['in_stock'],
+            date_sold=datetime.utcnow(),
+            seller_id=current_user.id,
+            location=(current_user.location or stock['location']).strip()
         )
         db.session.add(new_order)
-        db.session.commit()
 
-        # Update admin's inventory with reduced stock
-        admin_inventory = Inventory.query.filter_by(product_id=product_id).all()
-        for inventory in admin_inventory:
-            inventory.in_stock = inventory.quantity_in_stock  # Reflect the reduced stock for admin
-        db.session.commit()
+        # Admin-facing stock mirrors each seller's count: one UPDATE, not a loop over rows
+        inventory_table = Inventory.__table__
+        db.session.execute(
+            update(inventory_table)
+            .where(inventory_table.c.product_id == product_id,
+                   inventory_table.c.in_stock != inventory_table.c.quantity_in_stock)
+            .values(in_stock=inventory_table.c.quantity_in_stock)
+        )
 
-        flash(f"Order placed successfully for {product.name}!", 'success')
-    else:
+        enqueue_sheet_stock_update(stock['location'], stock['identification_number'], stock['in_stock'])
+        db.session.commit()  # the only commit: stock, order and sheet write land together
+
+        flash(f"Order placed successfully for {stock['name']}!", 'success')
+    except LookupError:
+        db.session.rollback()
+        flash('Product or inventory not found.', 'danger')
+    except OutOfStock:
+        db.session.rollback()
         flash('Not enough stock available.', 'danger')
 
     return redirect(url_for('seller_dashboard'))
@@ -1281,75 +3596,360 @@ def delete_sales_by_location():
         db.session.rollback()
         flash("Error deleting sales records: " + str(e), "danger")
 
-    return redirect(url_for('view_orders'))
+    return redirect(url_for('view_orders'))
+
+
+@app.route('/send-order', methods=['POST'])
+@login_required
+def send_order():
+    data = request.get_json()
+
+    product_id = data.get('product_id')
+    quantity = data.get('quantity')
+    selling_price = data.get('selling_price')
+    amount = data.get('amount')
+    date_sold = data.get('date_sold')
+
+    # Ensure current user is a seller
+    if current_user.role != 'seller':
+        return jsonify({'success': False, 'error': 'Only sellers can create orders'}), 403
+
+    # Validate required fields
+    if not all([product_id, quantity, selling_price, amount, date_sold]):
+        return jsonify({'success': False, 'error': 'All fields are required'}), 400
+
+    idempotency_key, error = parse_idempotency_key(data.get('idempotency_key'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    try:
+        # Convert data types
+        quantity = int(quantity)
+        selling_price = float(selling_price)
+        amount = float(amount)
+        date_sold_dt = datetime.strptime(date_sold, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+        if quantity <= 0:
+            return jsonify({'success': False, 'error': 'Quantity must be at least 1'}), 400
+
+        # A retried request with a key we already stored is a no-op
+        if idempotency_key:
+            existing = Order.query.filter_by(seller_id=current_user.id, idempotency_key=idempotency_key).first()
+            if existing:
+                return jsonify({'success': True, 'duplicate': True, 'remaining_stock': existing.in_stock}), 200
+
+        # Check and deduct stock in one statement per table
+        try:
+            stock = reserve_stock(product_id, quantity, seller_id=current_user.id)
+        except LookupError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except OutOfStock as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        # Save full seller location for admin visibility
+        full_location = current_user.location.strip()
+
+        # Create the order in the same transaction as the stock change
+        order = Order(
+            product_id=product_id,
+            quantity=quantity,
+            selling_price=selling_price,
+            amount=amount,
+            date_sold=date_sold_dt,
+            in_stock=stock['in_stock'],
+            seller_id=current_user.id,
+            location=full_location,  # full location saved
+            idempotency_key=idempotency_key
+        )
+        db.session.add(order)
+
+        # Queue the Google Sheet sync; it is written in the background
+        enqueue_sheet_stock_update(stock['location'], stock['identification_number'], stock['in_stock'])
+
+        db.session.commit()
+
+        return jsonify({'success': True, 'remaining_stock': stock['in_stock']}), 200
+
+    except IntegrityError as e:
+        db.session.rollback()
+        if idempotency_key and _orders_by_key(current_user.id, [idempotency_key]):
+            # A concurrent retry stored the same idempotency key first
+            return jsonify({'success': True, 'duplicate': True}), 200
+        print("Error saving order:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    except Exception as e:
+        db.session.rollback()
+        print("Error saving order:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+from collections import Counter
+from sqlalchemy.exc import IntegrityError
+
+CHECKOUT_MAX_LINES = 100
+REPLAY_MAX_ORDERS = 500
+IDEMPOTENCY_KEY_MAX_LENGTH = 64  # Order.idempotency_key is String(64)
+
+
+def parse_idempotency_key(value):
+    """Returns (key or None, None) or (None, error); a blank key means none was sent."""
+    if value is None:
+        return None, None
+    if not isinstance(value, str):
+        return None, 'idempotency_key must be a string'
+    value = value.strip()
+    if len(value) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f'idempotency_key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+    return value or None, None
+
+
+def _parse_checkout_line(line, default_date):
+    """Validate one cart line; returns (fields, None) or (None, error)."""
+    try:
+        product_id = int(line.get('product_id'))
+        quantity = int(line.get('quantity'))
+        selling_price = float(line.get('selling_price'))
+    except (TypeError, ValueError, AttributeError):
+        return None, 'product_id, quantity and selling_price are required'
+    if quantity <= 0:
+        return None, 'Quantity must be at least 1'
+    if selling_price < 0:
+        return None, 'Selling price cannot be negative'
+
+    idempotency_key, error = parse_idempotency_key(line.get('idempotency_key'))
+    if error:
+        return None, error
+
+    amount = line.get('amount')
+    date_sold = line.get('date_sold') or default_date
+    try:
+        amount = float(amount) if amount not in (None, '') else quantity * selling_price
+        date_sold_dt = datetime.strptime(date_sold, '%Y-%m-%dT%H:%M:%S.%fZ') if date_sold else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, 'Invalid amount or date_sold'
+
+    return {
+        'product_id': product_id,
+        'quantity': quantity,
+        'selling_price': selling_price,
+        'amount': amount,
+        'date_sold': date_sold_dt,
+        'idempotency_key': idempotency_key,
+    }, None
+
+
+def _orders_by_key(seller_id, keys):
+    keys = [key for key in keys if key]
+    if not keys:
+        return {}
+    return dict(db.session.query(Order.idempotency_key, Order.id).filter(
+        Order.seller_id == seller_id, Order.idempotency_key.in_(keys)
+    ).all())
+
+
+def sell_order_lines(parsed, seller):
+    """
+    Insert an Order per parsed line for `seller` in the current transaction.
+
+    Stock for every product is read with one query; each line then reserves
+    stock and inserts its Order under a savepoint, so a line that loses a
+    stock race or repeats an idempotency key is undone on its own. Queues
+    one sheet write per product; the caller commits.
 
+    Returns one outcome per line (None for unparsed lines): a dict with
+    status 'accepted', 'duplicate' or 'rejected', plus order_id,
+    remaining_stock or error.
+    """
+    outcomes = [None] * len(parsed)
+
+    # Keys already stored, or repeated earlier in this batch, are no-ops
+    existing = _orders_by_key(seller.id, (fields['idempotency_key'] for fields in parsed if fields))
+    seen = set()
+    for index, fields in enumerate(parsed):
+        key = fields and fields['idempotency_key']
+        if not key:
+            continue
+        if key in existing or key in seen:
+            outcomes[index] = {'status': 'duplicate', 'order_id': existing.get(key)}
+        seen.add(key)
+
+    # One query for the stock of every product in the batch
+    product_ids = {fields['product_id'] for fields in parsed if fields}
+    stock_on_hand = dict(
+        db.session.query(Product.id, Product.in_stock).filter(Product.id.in_(product_ids)).all()
+    ) if product_ids else {}
+
+    location = (seller.location or '').strip()
+    sheet_writes = {}
+    for index, fields in enumerate(parsed):
+        if not fields or outcomes[index]:
+            continue
+        product_id = fields['product_id']
+        if product_id not in stock_on_hand:
+            outcomes[index] = {'status': 'rejected', 'error': 'Product not found'}
+            continue
+        if stock_on_hand[product_id] < fields['quantity']:
+            outcomes[index] = {'status': 'rejected', 'error': 'Not enough stock available'}
+            continue
+
+        savepoint = db.session.begin_nested()
+        try:
+            stock = reserve_stock(product_id, fields['quantity'], seller_id=seller.id)
+            order = Order(
+                product_id=product_id,
+                quantity=fields['quantity'],
+                selling_price=fields['selling_price'],
+                amount=fields['amount'],
+                date_sold=fields['date_sold'],
+                in_stock=stock['in_stock'],
+                seller_id=seller.id,
+                location=location or stock['location'],
+                idempotency_key=fields['idempotency_key']
+            )
+            db.session.add(order)
+            db.session.flush()
+            savepoint.commit()
+        except (OutOfStock, LookupError) as e:
+            savepoint.rollback()
+            outcomes[index] = {'status': 'rejected', 'error': str(e)}
+            continue
+        except IntegrityError as e:
+            savepoint.rollback()
+            key = fields['idempotency_key']
+            order_id = _orders_by_key(seller.id, [key]).get(key)
+            if order_id is None:
+                outcomes[index] = {'status': 'rejected', 'error': str(e.orig)}
+            else:
+                # Another request stored this key first
+                outcomes[index] = {'status': 'duplicate', 'order_id': order_id}
+            continue
+
+        stock_on_hand[product_id] = stock['in_stock']
+        sheet_writes[product_id] = (stock['location'], stock['identification_number'], stock['in_stock'])
+        outcomes[index] = {'status': 'accepted', 'order_id': order.id, 'remaining_stock': stock['in_stock']}
+
+    # Repeats within the batch point at the order their first copy created
+    accepted = {
+        fields['idempotency_key']: outcome['order_id']
+        for fields, outcome in zip(parsed, outcomes)
+        if fields and fields['idempotency_key'] and outcome and outcome['status'] == 'accepted'
+    }
+    for fields, outcome in zip(parsed, outcomes):
+        if outcome and outcome['status'] == 'duplicate' and outcome['order_id'] is None:
+            outcome['order_id'] = accepted.get(fields['idempotency_key'])
 
-@app.route('/send-order', methods=['POST'])
-@login_required
-def send_order():
-    data = request.get_json()
+    enqueue_sheet_stock_updates(sheet_writes.values())
+    return outcomes
 
-    product_id = data.get('product_id')
-    quantity = data.get('quantity')
-    selling_price = data.get('selling_price')
-    amount = data.get('amount')
-    date_sold = data.get('date_sold')
 
-    # Ensure current user is a seller
+@app.route('/checkout', methods=['POST'])
+@login_required
+def checkout():
+    """
+    Sell a whole cart in one request.
+
+    Body: {"lines": [{"product_id", "quantity", "selling_price", "amount"?,
+    "date_sold"?, "idempotency_key"?}, ...], "date_sold"?}. Lines are sold
+    by sell_order_lines and committed once. Responds with a result per
+    line, in request order; a line whose key was already sold reports
+    success with "duplicate": true.
+    """
     if current_user.role != 'seller':
         return jsonify({'success': False, 'error': 'Only sellers can create orders'}), 403
 
-    # Validate required fields
-    if not all([product_id, quantity, selling_price, amount, date_sold]):
-        return jsonify({'success': False, 'error': 'All fields are required'}), 400
+    data = request.get_json(silent=True) or {}
+    lines = data.get('lines')
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'success': False, 'error': 'lines must be a non-empty list'}), 400
+    if len(lines) > CHECKOUT_MAX_LINES:
+        return jsonify({'success': False, 'error': f'At most {CHECKOUT_MAX_LINES} lines per checkout'}), 400
 
+    parsed, errors = zip(*(_parse_checkout_line(line, data.get('date_sold')) for line in lines))
     try:
-        # Convert data types
-        quantity = int(quantity)
-        selling_price = float(selling_price)
-        amount = float(amount)
-        date_sold_dt = datetime.strptime(date_sold, '%Y-%m-%dT%H:%M:%S.%fZ')
+        outcomes = sell_order_lines(parsed, current_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("Error during checkout:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Get product
-        product = Product.query.get(product_id)
-        if not product:
-            return jsonify({'success': False, 'error': 'Product not found'}), 404
+    results = []
+    for index, (fields, error, outcome) in enumerate(zip(parsed, errors, outcomes)):
+        result = {'index': index, 'product_id': fields['product_id'] if fields else None}
+        if outcome and outcome['status'] != 'rejected':
+            result['success'] = True
+            if outcome['status'] == 'duplicate':
+                result['duplicate'] = True
+            else:
+                result['remaining_stock'] = outcome['remaining_stock']
+        else:
+            result.update(success=False, error=error or outcome['error'])
+        results.append(result)
 
-        # Check stock availability
-        if product.in_stock < quantity:
-            return jsonify({'success': False, 'error': 'Not enough stock available'}), 400
+    sold = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': sold == len(lines),
+        'sold': sold,
+        'failed': len(lines) - sold,
+        'results': results,
+    }), 200 if sold else 400
 
-        # Update stock
-        product.in_stock -= quantity
 
-        # Sync updated stock with Google Sheet
-        update_google_sheet_stock(product.location, product.identification_number, product.in_stock)
+@app.route('/orders/replay', methods=['POST'])
+@login_required
+def replay_orders():
+    """
+    Apply a seller's offline outbox in one transaction.
+
+    Body: {"orders": [{"idempotency_key", "product_id", "quantity",
+    "selling_price", "amount"?, "date_sold"?}, ...]}. Every order must carry
+    a client-generated key; keys the seller already stored on an Order are reported
+    as duplicates and not applied again, so the page can resend the same
+    outbox until it gets an answer. Responds with accepted / duplicate /
+    rejected per order, in request order.
+    """
+    if current_user.role != 'seller':
+        return jsonify({'success': False, 'error': 'Only sellers can create orders'}), 403
 
-        # Save full seller location for admin visibility
-        full_location = current_user.location.strip()
+    data = request.get_json(silent=True) or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'success': False, 'error': 'orders must be a non-empty list'}), 400
+    if len(orders) > REPLAY_MAX_ORDERS:
+        return jsonify({'success': False, 'error': f'At most {REPLAY_MAX_ORDERS} orders per replay'}), 400
 
-        # Create the order
-        order = Order(
-            product_id=product_id,
-            quantity=quantity,
-            selling_price=selling_price,
-            amount=amount,
-            date_sold=date_sold_dt,
-            in_stock=product.in_stock,
-            seller_id=current_user.id,
-            location=full_location  # full location saved
-        )
+    parsed, errors = [], []
+    for order in orders:
+        fields, error = _parse_checkout_line(order, None)
+        if fields and not fields['idempotency_key']:
+            fields, error = None, 'idempotency_key is required'
+        parsed.append(fields)
+        errors.append(error)
 
-        db.session.add(order)
+    try:
+        outcomes = sell_order_lines(parsed, current_user)
         db.session.commit()
-
-        return jsonify({'success': True, 'remaining_stock': product.in_stock}), 200
-
     except Exception as e:
         db.session.rollback()
-        print("Error saving order:", e)
+        print("Error replaying orders:", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    report = []
+    for index, (order, error, outcome) in enumerate(zip(orders, errors, outcomes)):
+        key = order.get('idempotency_key') if isinstance(order, dict) else None
+        report.append({'index': index, 'idempotency_key': key, **(outcome or {'status': 'rejected', 'error': error})})
+
+    counts = Counter(entry['status'] for entry in report)
+    return jsonify({
+        'success': True,
+        'accepted': counts['accepted'],
+        'duplicate': counts['duplicate'],
+        'rejected': counts['rejected'],
+        'results': report,
+    })
 
 
 @app.route('/view_users')
@@ -1385,7 +3985,8 @@ def select_order_location():
 @login_required
 def clear_inventories():
     try:
-        # Delete all entries from BakerInventory
+        # Delete all entries from BakerInventory, taking approved costs out of the summary
+        withdraw_from_summaries(bakery_filters=[])
         num_deleted = BakerInventory.query.delete()  # note: class name, not string
         db.session.commit()
         flash(f"✅ Cleared {num_deleted} baker inventory submissions.", "success")
@@ -1396,6 +3997,103 @@ def clear_inventories():
 
 
 
+TOP_PRODUCTS_LIMIT = 5
+
+
+CHART_MAX_PRODUCTS = 20    # the rest are folded into "Other"
+CHART_MAX_DAILY_POINTS = 200  # longer ranges are returned per month
+CHART_CACHE_SECONDS = 60
+
+
+def order_analytics(location='', start_date='', end_date=''):
+    """
+    Best seller, per-product totals and a daily series for a location,
+    each from one GROUP BY over daily_sales_rollup.
+
+    Dates are inclusive YYYY-MM-DD strings; location matches like the
+    dashboard filter (case-insensitive substring).
+    """
+    filters = _summary_filters(DailySalesRollup, location, start_date, end_date)
+    quantity = func.coalesce(func.sum(DailySalesRollup.quantity), 0)
+    amount = func.coalesce(func.sum(DailySalesRollup.amount), 0)
+
+    best = db.session.query(User.username, quantity.label('quantity')).join(
+        User, User.id == DailySalesRollup.seller_id
+    ).filter(*filters).group_by(User.id, User.username).order_by(quantity.desc(), User.id).first()
+
+    product_name = func.coalesce(Product.name, 'Unknown')
+    product_rows = db.session.query(
+        product_name.label('product_name'), quantity.label('quantity'), amount.label('amount')
+    ).outerjoin(Product, Product.id == DailySalesRollup.product_id).filter(*filters).group_by(
+        product_name
+    ).order_by(quantity.desc(), product_name).all()
+
+    daily_rows = db.session.query(
+        DailySalesRollup.day, quantity.label('quantity'), amount.label('amount')
+    ).filter(*filters).group_by(DailySalesRollup.day).order_by(DailySalesRollup.day).all()
+
+    products = [
+        {'product_name': row.product_name, 'quantity': int(row.quantity or 0), 'amount': float(row.amount or 0)}
+        for row in product_rows
+    ]
+    return {
+        'best_seller': {
+            'name': best.username if best else "N/A",
+            'quantity': int(best.quantity or 0) if best else 0,
+        },
+        'top_products': [[p['product_name'], p['quantity']] for p in products[:TOP_PRODUCTS_LIMIT]],
+        'products': products,
+        'daily': [
+            {'day': _sql_date(row.day).isoformat(), 'quantity': int(row.quantity or 0), 'amount': float(row.amount or 0)}
+            for row in daily_rows
+        ],
+    }
+
+
+def chart_products(products, limit=CHART_MAX_PRODUCTS):
+    """Pie/bar data: the top `limit` products by quantity plus an "Other" slice."""
+    top, rest = products[:limit], products[limit:]
+    if rest:
+        top = top + [{
+            'product_name': 'Other',
+            'quantity': sum(p['quantity'] for p in rest),
+            'amount': sum(p['amount'] for p in rest),
+        }]
+    return {
+        'labels': [p['product_name'] for p in top],
+        'quantities': [p['quantity'] for p in top],
+        'revenues': [round(p['amount'], 2) for p in top],
+    }
+
+
+def chart_daily(daily, max_points=CHART_MAX_DAILY_POINTS):
+    """Sales-over-time data, folded into months when there are too many days."""
+    grain = 'day'
+    if len(daily) > max_points:
+        grain = 'month'
+        months = {}
+        for point in daily:
+            month = months.setdefault(point['day'][:7], {'day': point['day'][:7], 'quantity': 0, 'amount': 0.0})
+            month['quantity'] += point['quantity']
+            month['amount'] += point['amount']
+        daily = list(months.values())
+    return {
+        'grain': grain,
+        'labels': [p['day'] for p in daily],
+        'quantities': [p['quantity'] for p in daily],
+        'revenues': [round(p['amount'], 2) for p in daily],
+    }
+
+
+def cached_json(payload):
+    """JSON response with an ETag and a short private cache lifetime."""
+    response = jsonify(payload)
+    response.cache_control.private = True
+    response.cache_control.max_age = CHART_CACHE_SECONDS
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 # Admin: View Orders
 @app.route('/admin/orders')
 def view_orders():
@@ -1403,50 +4101,29 @@ def view_orders():
     if not selected_location:
         return redirect(url_for('select_order_location'))
 
-    # Filter orders
-    orders = (
-        Order.query
-        .filter(Order.location.ilike(f"%{selected_location}%"))
-        .all()
+    dates = drop_invalid_dates({
+        'start_date': request.args.get('start_date', '').strip(),
+        'end_date': request.args.get('end_date', '').strip(),
+    }, 'start_date', 'end_date')
+    start_date, end_date = dates['start_date'], dates['end_date']
+
+    # One page of orders (product and seller names joined in)
+    orders, next_cursor = orders_page(
+        start_date=start_date,
+        end_date=end_date,
+        location=selected_location,
+        cursor=request.args.get('after', ''),
+        limit=request.args.get('limit', ORDERS_PAGE_SIZE, type=int)
     )
 
-    # Collect data for charts and seller/product performance
-    sales_data = []
-    seller_performance = defaultdict(int)
-    product_sales = defaultdict(int)
-
-    for order in orders:
-        sales_data.append({
-            "product_name": order.product.name if order.product else "Unknown",
-            "quantity_sold": order.quantity or 0,
-            "total_price": order.amount or 0,
-            "sale_date": order.created_at.strftime("%Y-%m-%d") if order.created_at else None
-        })
-
-        if order.seller:
-            seller_performance[order.seller.id] += order.quantity or 0
+    # Charts and seller/product performance, aggregated in SQL
+    analytics = order_analytics(selected_location, start_date, end_date)
 
-        if order.product:
-            product_sales[order.product.name] += order.quantity or 0
-
-    # Best seller
-    if seller_performance:
-        best_seller_id = max(seller_performance.items(), key=lambda x: x[1])[0]
-        best_seller_name = User.query.get(best_seller_id).username
-        best_seller_sales = seller_performance[best_seller_id]
-    else:
-        best_seller_name = "N/A"
-        best_seller_sales = 0
-
-    # Top 5 products
-    top_5_products = sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:5]
-
-    # ✅ Financial Summary (fixed)
-    bakeries = BakerInventory.query.filter_by(status='approved').all()
-
-    total_purchase_cost = sum(b.total_purchase_cost for b in bakeries)
-    total_usage_cost = sum(b.total_usage_cost for b in bakeries)  # 🔑 usage cost pulled same way
-    total_sales = sum(order.amount or 0 for order in orders)
+    # ✅ Financial Summary, scoped like the PDF report linked from this page
+    totals = financial_totals(location=selected_location, start_date=start_date, end_date=end_date)
+    total_purchase_cost = totals['total_purchase_cost']
+    total_usage_cost = totals['total_usage_cost']  # 🔑 usage cost pulled same way
+    total_sales = totals['total_sales']
 
     # 🔥 Profit/Loss now based ONLY on usage cost
     profit_loss = total_sales - total_usage_cost
@@ -1454,11 +4131,13 @@ def view_orders():
     return render_template(
         'admin_orders.html',
         orders=orders,
+        next_cursor=next_cursor,
         selected_location=selected_location,
-        sales_data=sales_data,
-        best_seller_name=best_seller_name,
-        best_seller_sales=best_seller_sales,
-        top_5_products=top_5_products,
+        start_date=start_date,
+        end_date=end_date,
+        best_seller_name=analytics['best_seller']['name'],
+        best_seller_sales=analytics['best_seller']['quantity'],
+        top_5_products=analytics['top_products'],
         total_sales=total_sales,
         total_purchase_cost=total_purchase_cost,  # still shown separately
         total_usage_cost=total_usage_cost,        # ✅ now displayed
@@ -1466,43 +4145,217 @@ def view_orders():
     )
 
 
+@app.route('/admin/orders/analytics')
+@login_required
+def order_analytics_api():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    try:
+        analytics = order_analytics(
+            location=request.args.get('location', '').strip(),
+            start_date=request.args.get('start_date', '').strip(),
+            end_date=request.args.get('end_date', '').strip()
+        )
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({'success': True, **analytics})
+
 
+@app.route('/admin/orders/charts/<chart>')
+@login_required
+def order_chart_data(chart):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    if chart not in ('products', 'daily'):
+        return jsonify({'success': False, 'error': 'Unknown chart'}), 404
 
-@app.route('/export/financial-summary')
-def export_financial_summary():
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    import io
-    from flask import send_file
-
-    # Calculate totals
-    bakeries = BakerInventory.query.filter_by(status='approved').all()
-    orders = Order.query.all()
-
-    total_sales = sum(order.amount or 0 for order in orders)
-    total_purchase_cost = sum(b.total_purchase_cost for b in bakeries)
-    total_usage_cost = sum(b.total_usage_cost for b in bakeries)
-    profit_loss = total_sales - total_usage_cost
+    try:
+        analytics = order_analytics(
+            location=request.args.get('location', '').strip(),
+            start_date=request.args.get('start_date', '').strip(),
+            end_date=request.args.get('end_date', '').strip()
+        )
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    if chart == 'products':
+        return cached_json({'success': True, **chart_products(analytics['products'])})
+    return cached_json({'success': True, **chart_daily(analytics['daily'])})
+
+
+
+
+def financial_report_data(location='', start_date='', end_date=''):
+    """
+    Totals plus per-location, per-month and location-by-month breakdowns
+    for the financial report, each one GROUP BY over financial_summary.
+    Profit is sales minus usage cost, as on the dashboard.
+    """
+    from sqlalchemy import extract
+
+    measures = (
+        func.coalesce(func.sum(FinancialSummary.order_count), 0),
+        func.coalesce(func.sum(FinancialSummary.sales_total), 0),
+        func.coalesce(func.sum(FinancialSummary.purchase_cost), 0),
+        func.coalesce(func.sum(FinancialSummary.usage_cost), 0),
+    )
+    filters = _summary_filters(FinancialSummary, location, start_date, end_date)
+    year = extract('year', FinancialSummary.day)
+    month = extract('month', FinancialSummary.day)
+
+    def line(label, orders, sales, purchase, usage):
+        sales, purchase, usage = float(sales or 0), float(purchase or 0), float(usage or 0)
+        return {'label': label, 'orders': int(orders or 0), 'sales': sales, 'purchase_cost': purchase,
+                'usage_cost': usage, 'profit': sales - usage}
+
+    totals = line('Total', *db.session.query(*measures).filter(*filters).one())
+    by_location = [
+        line(row[0] or 'Unassigned', *row[1:])
+        for row in db.session.query(FinancialSummary.location, *measures).filter(*filters)
+        .group_by(FinancialSummary.location).order_by(FinancialSummary.location)
+    ]
+    by_month = [
+        line(f"{int(row[0]):04d}-{int(row[1]):02d}", *row[2:])
+        for row in db.session.query(year, month, *measures).filter(*filters)
+        .group_by(year, month).order_by(year, month)
+    ]
+    detail = defaultdict(list)
+    for row in db.session.query(year, month, FinancialSummary.location, *measures).filter(*filters) \
+            .group_by(year, month, FinancialSummary.location).order_by(year, month, FinancialSummary.location):
+        detail[f"{int(row[0]):04d}-{int(row[1]):02d}"].append(line(row[2] or 'Unassigned', *row[3:]))
+
+    return {'totals': totals, 'by_location': by_location, 'by_month': by_month, 'detail': dict(detail)}
+
+
+def write_financial_summary_pdf(output, location='', start_date='', end_date=''):
+    """Render the multi-page financial report (reportlab platypus) into output."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
 
-    # Create PDF
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    report = financial_report_data(location, start_date, end_date)
+    styles = getSampleStyleSheet()
+    period = f"{start_date or 'first record'} to {end_date or 'today'}"
+    if location:
+        period += f", location matching “{location}”"
+
+    def money(value):
+        return f"₦{value:,.2f}"
+
+    def table(first_column, lines, totals=None):
+        rows = [[first_column, 'Orders', 'Sales', 'Purchase cost', 'Usage cost', 'Profit/Loss']]
+        for item in lines + ([totals] if totals else []):
+            rows.append([item['label'], f"{item['orders']:,}", money(item['sales']), money(item['purchase_cost']),
+                         money(item['usage_cost']), money(item['profit'])])
+        style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0a1f44')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f3f4f6')]),
+        ]
+        if totals:
+            style += [('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'), ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black)]
+        result = Table(rows, repeatRows=1, colWidths=[4.2 * cm] + [2.6 * cm] * 5)
+        result.setStyle(TableStyle(style))
+        return result
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(2 * cm, 1.2 * cm, f"Financial report, {period}")
+        canvas.drawRightString(A4[0] - 2 * cm, 1.2 * cm, f"Page {doc.page}")
+        canvas.restoreState()
+
+    totals = report['totals']
+    story = [
+        Paragraph("Financial Report", styles['Title']),
+        Paragraph(f"Period: {period}", styles['Normal']),
+        Paragraph(f"Rendered {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC; "
+                  "re-rendered whenever the figures change", styles['Normal']),
+        Spacer(1, 0.6 * cm),
+        Paragraph("Summary", styles['Heading2']),
+        Table([
+            ['Orders', f"{totals['orders']:,}"],
+            ['Total sales', money(totals['sales'])],
+            ['Purchase cost', money(totals['purchase_cost'])],
+            ['Usage cost', money(totals['usage_cost'])],
+            ['Profit/Loss (sales - usage cost)', money(totals['profit'])],
+        ], colWidths=[7 * cm, 4 * cm], style=TableStyle([
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ])),
+        Spacer(1, 0.6 * cm),
+        Paragraph("By location", styles['Heading2']),
+        Paragraph("Sales are grouped by order location, costs by the submitting baker's location.", styles['Italic']),
+        table('Location', report['by_location'], totals),
+        Spacer(1, 0.6 * cm),
+        Paragraph("By month", styles['Heading2']),
+        table('Month', report['by_month'], totals),
+    ]
+    if report['detail']:
+        story += [PageBreak(), Paragraph("Monthly detail by location", styles['Heading2'])]
+        months = {item['label']: item for item in report['by_month']}
+        for month_label, lines in report['detail'].items():
+            story += [Paragraph(month_label, styles['Heading3']), table('Location', lines, months[month_label]),
+                      Spacer(1, 0.4 * cm)]
+
+    doc = SimpleDocTemplate(output, pagesize=A4, title="Financial Report",
+                            leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm)
+    doc.build(story, onFirstPage=footer, onLaterPages=footer)
+
+
+def financial_report_version(location='', start_date='', end_date=''):
+    """Digest of the financial_summary rows a report covers; any upsert or rebuild changes it."""
+    values = db.session.query(
+        func.count(FinancialSummary.id), func.max(FinancialSummary.updated_at),
+        func.sum(FinancialSummary.sales_total), func.sum(FinancialSummary.purchase_cost),
+        func.sum(FinancialSummary.usage_cost)
+    ).filter(*_summary_filters(FinancialSummary, location, start_date, end_date)).one()
+    return _digest([location, start_date, end_date] + [str(value) for value in values])
+
+
+def cached_financial_report(location='', start_date='', end_date=''):
+    """
+    Path of the rendered report for this period and data version, under
+    EXPORT_DIR. Rendered once per version and shared by every worker on
+    the host; prune_export_jobs clears old copies.
+    """
+    path = os.path.join(EXPORT_DIR, f"financial_report-{financial_report_version(location, start_date, end_date)}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(partial, 'wb') as output:
+                write_financial_summary_pdf(output, location, start_date, end_date)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    return path
 
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(100, 750, "Financial Summary")
 
-    p.setFont("Helvetica", 12)
-    p.drawString(100, 720, f"Total Sales: ₦{total_sales:.2f}")
-    p.drawString(100, 700, f"Purchase Cost: ₦{total_purchase_cost:.2f}")
-    p.drawString(100, 680, f"Usage Cost: ₦{total_usage_cost:.2f}")
-    p.drawString(100, 660, f"Profit/Loss: ₦{profit_loss:.2f}")
+@app.route('/export/financial-summary')
+def export_financial_summary():
+    if not current_user.is_authenticated or current_user.role != 'admin':
+        return "Unauthorized", 403
 
-    p.showPage()
-    p.save()
-    buffer.seek(0)
+    location = request.args.get('location', '').strip()
+    start_date = request.args.get('start_date', '').strip()
+    end_date = request.args.get('end_date', '').strip()
+    try:
+        _summary_filters(FinancialSummary, location, start_date, end_date)
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
 
     return send_file(
-        buffer,
+        cached_financial_report(location, start_date, end_date),
         as_attachment=True,
         download_name="financial_summary.pdf",
         mimetype="application/pdf"
@@ -1515,8 +4368,21 @@ def delete_all_products():
         # First delete dependent inventory rows
         Inventory.query.delete()
 
+        # Close every product's stock in the ledger with one INSERT ... SELECT
+        product_table = Product.__table__
+        db.session.execute(StockHistory.__table__.insert().from_select(
+            ['kind', 'location', 'identification_number', 'change_amount', 'balance_after',
+             'admin_id', 'reason', 'created_at'],
+            select(
+                literal('deletion'), product_table.c.location, product_table.c.identification_number,
+                -product_table.c.in_stock, literal(0), literal(current_user.id if current_user.is_authenticated else None, db.Integer),
+                literal('All products deleted'), literal(datetime.utcnow(), db.DateTime)
+            ).where(product_table.c.in_stock != 0)
+        ))
+
         # Now delete products
         num_deleted = Product.query.delete()
+        forget_sheet_fingerprints()
         db.session.commit()
         flash(f"All {num_deleted} products and related inventory deleted successfully.", "success")
     except Exception as e:
@@ -1534,6 +4400,12 @@ def delete_user(user_id):
         return redirect(url_for('view_users'))
 
     try:
+        # Take the user's orders and approved submissions out of the summaries
+        withdraw_from_summaries(
+            order_filters=[Order.seller_id == user.id],
+            bakery_filters=[BakerInventory.seller_id == user.id]
+        )
+
         # Delete related BakerInventory
         BakerInventory.query.filter_by(seller_id=user.id).delete()
 
@@ -1556,10 +4428,105 @@ def delete_user(user_id):
 
 
 
-from flask import send_file
-import pandas as pd
-from io import BytesIO
-from datetime import datetime, timedelta
+import csv
+import io
+import tempfile
+from flask import Response, send_file, stream_with_context
+from openpyxl import Workbook
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # rows fetched per round trip and per CSV chunk
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def stream_rows(query):
+    """Run a row query with a server-side cursor, EXPORT_BATCH_SIZE rows at a time."""
+    return db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+def iter_csv(header, rows):
+    """Encode rows as CSV, one chunk per EXPORT_BATCH_SIZE rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(sheet_title, header, rows):
+    """
+    Write rows through an openpyxl write-only workbook into a temporary
+    file, then stream that file. An .xlsx is a zip, so the first byte can
+    only go out once the workbook is saved, but memory stays flat.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_response(file_format, basename, sheet_title, header, rows):
+    """Streamed attachment response for a CSV or XLSX export."""
+    if file_format == 'csv':
+        body = iter_csv(header, rows)
+    else:
+        body = iter_xlsx(sheet_title, header, rows)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={basename}.{file_format}'}
+    )
+
+
+def _export_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+SALES_EXPORT_HEADER = ('Date Sold', 'Product Name', 'Quantity', 'Amount', 'Seller', 'Location', 'Created At')
+
+
+def sales_export_rows(start_date='', end_date='', location=''):
+    """
+    Sales export rows from one Order/Product/User query, streamed from the DB.
+    Filtered with _order_filters, like the orders page the export is linked from.
+    """
+    query = select(
+        Order.date_sold, Product.name, Order.quantity, Order.amount, User.username, Product.location,
+        Order.created_at
+    ).outerjoin(Product, Product.id == Order.product_id).outerjoin(User, User.id == Order.seller_id).where(
+        *_order_filters(start_date, end_date, location)
+    )
+    query = query.order_by(Order.date_sold.desc(), Order.id.desc())
+
+    for date_sold, product_name, quantity, amount, seller, product_location, created_at in stream_rows(query):
+        yield (
+            _export_time(date_sold),
+            product_name or 'Unknown Product',
+            quantity,
+            amount,
+            seller or 'Unknown Seller',
+            product_location or 'Unknown Location',
+            _export_time(created_at),
+        )
+
 
 @app.route('/export_sales_data', methods=['GET'])
 def export_sales_data():
@@ -1570,65 +4537,504 @@ def export_sales_data():
     start_date_str = request.args.get('start_date', '')
     end_date_str = request.args.get('end_date', '')
     location = request.args.get('location', '')
+    file_format = request.args.get('format', 'xlsx').lower()
 
-    query = Order.query
+    if file_format not in EXPORT_FORMATS:
+        return "Format must be csv or xlsx", 400
+    try:
+        date_range_filters(Order.date_sold, start_date_str, end_date_str)
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
 
-    # Apply filters
-    if start_date_str:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        query = query.filter(Order.created_at >= start_date)
-    if end_date_str:
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1)
-        query = query.filter(Order.created_at <= end_date)
-    if location:
-        query = query.join(Product).filter(Product.location == location)
+    rows = sales_export_rows(start_date_str, end_date_str, location)
+    return export_response(file_format, 'sales_data', 'Sales Data', SALES_EXPORT_HEADER, rows)
 
-    orders = query.order_by(Order.created_at.desc()).all()
 
-    # Prepare data
-    data = []
-    for order in orders:
-        # Get the location from the related Product model
-        product_location = order.product.location if order.product else 'Unknown Location'
-
-        data.append({
-            'Date Sold': order.date_sold.strftime('%Y-%m-%d %H:%M:%S') if order.date_sold else '',
-            'Product Name': order.product.name if order.product else 'Unknown Product',
-            'Quantity': order.quantity,
-            'Amount': order.amount,
-            'Seller': order.seller.username if order.seller else 'Unknown Seller',
-            'Location': product_location,  # Use location here
-            'Created At': order.created_at.strftime('%Y-%m-%d %H:%M:%S') if order.created_at else ''
-        })
 
-    if not data:
-        data.append({
-            'Date Sold': '',
-            'Product Name': '',
-            'Quantity': '',
-            'Amount': '',
-            'Seller': '',
-            'Location': '',  
-            'Created At': ''
-        })
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "jomaviko-exports"))
+EXPORT_RETENTION_HOURS = int(os.getenv("EXPORT_RETENTION_HOURS", "72"))  # finished files kept on disk
+EXPORT_STALE_SECONDS = 3600        # a queued/running job older than this is assumed lost with its worker
+EXPORT_PROGRESS_ROWS = 5000        # rows between progress updates
+
+# kind -> (allowed formats, filters it accepts)
+EXPORT_KINDS = {
+    'sales': (('xlsx', 'csv'), ('start_date', 'end_date', 'location')),
+    'stock_history': (('xlsx', 'csv'), ('start_date', 'end_date', 'admin_id', 'product_id', 'location')),
+    'financial_summary': (('pdf',), ('start_date', 'end_date', 'location')),
+    'analytics': (('zip',), ('start_date', 'end_date', 'location')),  # Parquet datasets, see write_analytics_parquet
+}
+EXPORT_MIMETYPES = {**EXPORT_FORMATS, 'pdf': 'application/pdf', 'zip': 'application/zip'}
 
-    # Create an Excel file
-    df = pd.DataFrame(data)
 
-    # Create an Excel file in memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sales Data')
+def normalize_export_params(kind, args):
+    """
+    Validated, canonical filters for an export job: unknown and empty
+    fields are dropped, dates and IDs are parsed, so equivalent requests
+    share a cache key. Raises ValueError.
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export: {kind}")
+    formats, fields = EXPORT_KINDS[kind]
+
+    params = {'format': (args.get('format') or formats[0]).strip().lower()}
+    if params['format'] not in formats:
+        raise ValueError(f"Format must be one of: {', '.join(formats)}")
+    for field in fields:
+        value = (args.get(field) or '').strip()
+        if not value:
+            continue
+        try:
+            if field.endswith('_date'):
+                value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            elif field.endswith('_id'):
+                value = int(value)
+        except ValueError:
+            raise ValueError(f"{field} must be {'YYYY-MM-DD' if field.endswith('_date') else 'a whole number'}")
+        params[field] = value
+    return params
 
-    output.seek(0)
 
-    return send_file(
-        output,
-        download_name='sales_data.xlsx',
-        as_attachment=True,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+def export_data_version(kind):
+    """
+    Cheap digest of the tables an export reads: row counts, highest ids
+    and latest updated_at. Inserts and deletes move the counts, in-place
+    edits through the ORM or Core updates move updated_at; raw SQL that
+    leaves updated_at alone is not seen.
+    """
+    values = [db.session.query(func.max(SheetTabFingerprint.imported_at)).scalar()]
+    if kind in ('financial_summary', 'analytics'):
+        # Order inserts/deletes and baker approvals all move the summary table
+        values.extend(db.session.query(
+            func.count(FinancialSummary.id), func.max(FinancialSummary.updated_at),
+            func.sum(FinancialSummary.sales_total), func.sum(FinancialSummary.purchase_cost),
+            func.sum(FinancialSummary.usage_cost)
+        ).one())
+    if kind == 'analytics':
+        for model in (Order, Product, User, Inventory, CreditSale, BakerInventory):
+            values.extend(db.session.query(
+                func.count(model.id), func.max(model.id), func.max(model.updated_at)
+            ).one())
+        values.append(db.session.query(func.sum(Inventory.quantity_in_stock)).scalar())
+        values.extend(db.session.query(
+            func.count(CreditSale.id).filter(CreditSale.fully_paid.is_(True)), func.sum(CreditSale.amount_owing)
+        ).one())
+    elif kind != 'financial_summary':
+        source = Order if kind == 'sales' else StockHistory
+        for model in (source, Product, User):
+            values.extend(db.session.query(func.count(model.id), func.max(model.id)).one())
+        for model in (Product, User) + ((Order,) if kind == 'sales' else ()):
+            values.append(db.session.query(func.max(model.updated_at)).scalar())
+    return _digest([str(value) for value in values])
+
+
+def _export_file_ready(job):
+    return job.status == 'succeeded' and job.file_path and os.path.exists(job.file_path)
+
+
+def fail_stale_export_jobs(now=None):
+    """
+    Mark queued/running jobs older than EXPORT_STALE_SECONDS as failed, since
+    their worker is gone, and delete .part files left behind in EXPORT_DIR.
+    """
+    stale_before = (now or datetime.utcnow()) - timedelta(seconds=EXPORT_STALE_SECONDS)
+    failed = ExportJob.query.filter(
+        ExportJob.status.in_(('queued', 'running')), ExportJob.created_at < stale_before
+    ).update({
+        'status': 'failed',
+        'error': 'Worker stopped before the export finished',
+        'finished_at': datetime.utcnow(),
+    }, synchronize_session='fetch')
+    db.session.commit()
+
+    if os.path.isdir(EXPORT_DIR):
+        for file_name in os.listdir(EXPORT_DIR):
+            path = os.path.join(EXPORT_DIR, file_name)
+            if file_name.endswith('.part') and datetime.utcfromtimestamp(os.path.getmtime(path)) < stale_before:
+                os.remove(path)
+    return failed
+
+
+def queue_export_job(kind, params):
+    """
+    Return the job for (kind, params, current data version): a finished
+    one whose file is still on disk, one already in progress, or a new
+    job handed to the background pool.
+    """
+    fail_stale_export_jobs()
+    data_version = export_data_version(kind)
+    cache_key = _digest([kind, params, data_version])
+
+    for job in ExportJob.query.filter_by(cache_key=cache_key).order_by(ExportJob.id.desc()):
+        if _export_file_ready(job) or job.status in ('queued', 'running'):
+            return job, True
+
+    job = ExportJob(
+        kind=kind,
+        params=params,
+        data_version=data_version,
+        cache_key=cache_key,
+        requested_by=current_user.id if current_user.is_authenticated else None
+    )
+    db.session.add(job)
+    db.session.commit()
+    submit_background(run_export_job, job.id)
+    return job, False
+
+
+def _report_export_progress(job_id, rows_written):
+    # Own connection: the export's cursor is still open on the session
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(ExportJob.__table__).where(ExportJob.id == job_id).values(rows_written=rows_written)
+        )
+
+
+def _counted(job_id, rows, progress):
+    # SQLite cannot commit beside the export's open read, so it only gets the final count
+    live = db.engine.dialect.name != 'sqlite'
+    for row in rows:
+        yield row
+        progress['rows'] += 1
+        if live and progress['rows'] % EXPORT_PROGRESS_ROWS == 0:
+            _report_export_progress(job_id, progress['rows'])
+
+
+def write_export_file(job_id, kind, params, output):
+    """Write one export into a binary file object, reusing the streaming exports. Returns the row count."""
+    if kind == 'financial_summary':
+        write_financial_summary_pdf(output, params.get('location', ''), params.get('start_date', ''),
+                                    params.get('end_date', ''))
+        return 0
+    if kind == 'analytics':
+        return write_analytics_zip(output, params.get('start_date', ''), params.get('end_date', ''),
+                                   params.get('location', ''))
+
+    if kind == 'sales':
+        header, sheet_title = SALES_EXPORT_HEADER, 'Sales Data'
+        rows = sales_export_rows(params.get('start_date', ''), params.get('end_date', ''), params.get('location', ''))
+    else:
+        header, sheet_title = STOCK_HISTORY_EXPORT_HEADER, 'Stock History'
+        rows = stock_history_export_rows(_stock_history_filters(
+            start_date=params.get('start_date', ''),
+            end_date=params.get('end_date', ''),
+            admin_id=params.get('admin_id'),
+            product_id=params.get('product_id'),
+            location=params.get('location', '')
+        ))
+
+    progress = {'rows': 0}
+    rows = _counted(job_id, rows, progress)
+    chunks = iter_csv(header, rows) if params['format'] == 'csv' else iter_xlsx(sheet_title, header, rows)
+    for chunk in chunks:
+        output.write(chunk)
+    return progress['rows']
+
+
+EXPORT_BASENAMES = {
+    'sales': 'sales_data',
+    'stock_history': 'stock_history_filtered',
+    'financial_summary': 'financial_summary',
+    'analytics': 'jomaviko_analytics',
+}
+
+
+def run_export_job(job_id):
+    """Generate a queued ExportJob's file under EXPORT_DIR and record the outcome."""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None or job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        kind, params = job.kind, dict(job.params or {})
+        db.session.commit()
+
+        file_name = f"{EXPORT_BASENAMES[kind]}.{params['format']}"
+        path = os.path.join(EXPORT_DIR, f"{job_id}-{file_name}")
+        error = None
+        rows_written = 0
+        try:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            with open(path + '.part', 'wb') as output:
+                rows_written = write_export_file(job_id, kind, params, output)
+            os.replace(path + '.part', path)
+        except Exception as e:
+            db.session.rollback()
+            error = str(e)
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+
+        db.session.remove()
+        job = db.session.get(ExportJob, job_id)
+        job.error = error
+        job.status = 'failed' if error else 'succeeded'
+        if not error:
+            job.rows_written = rows_written
+            job.file_path = path
+            job.file_name = file_name
+            job.file_size = os.path.getsize(path)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        print(f"{'❌' if error else '✅'} Export job #{job_id} ({kind}) {job.status}")
+        return job.to_dict()
+
+
+def _export_job_payload(job, cached=False):
+    payload = {'success': True, 'cached': cached, **job.to_dict()}
+    payload['status_url'] = url_for('export_job_status', job_id=job.id)
+    if _export_file_ready(job):
+        payload['download_url'] = url_for('download_export', job_id=job.id)
+    return payload
+
+
+@app.route('/admin/exports/<kind>', methods=['POST'])
+@login_required
+def request_export(kind):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    try:
+        params = normalize_export_params(kind, request.get_json(silent=True) or request.values)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    job, cached = queue_export_job(kind, params)
+    return jsonify(_export_job_payload(job, cached)), 200 if cached else 202
+
+
+@app.route('/admin/exports/jobs/<int:job_id>')
+@login_required
+def export_job_status(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job.status in ('queued', 'running'):
+        fail_stale_export_jobs()
+    return jsonify(_export_job_payload(job))
+
+
+@app.route('/admin/exports/jobs/<int:job_id>/download')
+@login_required
+def download_export(job_id):
+    if current_user.role != 'admin':
+        return "Unauthorized", 403
+
+    job = db.session.get(ExportJob, job_id)
+    if not job or not _export_file_ready(job):
+        return "Export not ready or expired.", 404
+    mimetype = EXPORT_MIMETYPES[job.params['format']]
+    return send_file(job.file_path, as_attachment=True, download_name=job.file_name, mimetype=mimetype)
+
+
+def prune_export_jobs(now=None):
+    """Delete export files and jobs, and cached financial reports, older than EXPORT_RETENTION_HOURS."""
+    fail_stale_export_jobs(now)
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=EXPORT_RETENTION_HOURS)
+    jobs = ExportJob.query.filter(ExportJob.created_at < cutoff, ExportJob.status.in_(('succeeded', 'failed'))).all()
+    for job in jobs:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+    db.session.commit()
+
+    if os.path.isdir(EXPORT_DIR):
+        for file_name in os.listdir(EXPORT_DIR):
+            path = os.path.join(EXPORT_DIR, file_name)
+            if file_name.startswith('financial_report-') and datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+    return len(jobs)
+
+
+@app.cli.command("prune-exports")
+def prune_exports_command():
+    """Remove export files past their retention period."""
+    removed = prune_export_jobs()
+    print(f"✅ Removed {removed} expired export job(s)")
+
+
+
+PARQUET_BATCH_ROWS = int(os.getenv("PARQUET_BATCH_ROWS", "50000"))  # rows per Arrow record batch
+
+
+def _analytics_datasets(pa, start_date='', end_date='', location=''):
+    """
+    (name, Arrow schema, partition fields, query) for each dataset in the
+    analytics export. Each query's columns line up with its schema; the
+    last columns feed the partitions: location, then the timestamp the
+    month is taken from.
+    """
+    seller = aliased(User)
+    money = pa.decimal128(12, 2)
+
+    orders = select(
+        Order.id, Order.date_sold, Order.product_id, Product.identification_number, Product.name,
+        Order.quantity, Order.selling_price, Order.amount, Order.in_stock, Order.seller_id, seller.username,
+        Order.location, Order.date_sold
+    ).outerjoin(Product, Product.id == Order.product_id).outerjoin(seller, seller.id == Order.seller_id).where(
+        *_order_filters(start_date, end_date)
+    )
+    if location:
+        orders = orders.where(Order.location == location)
+
+    products = select(
+        Product.id, Product.identification_number, Product.name, Product.price, Product.selling_price,
+        Product.in_stock, Product.location
+    )
+    inventory = select(
+        Inventory.id, Inventory.product_id, Product.identification_number, Inventory.seller_id, seller.username,
+        Inventory.quantity_in_stock, Inventory.quantity_sold, Inventory.in_stock, Product.location
+    ).join(Product, Product.id == Inventory.product_id).outerjoin(seller, seller.id == Inventory.seller_id)
+    if location:
+        products = products.where(Product.location == location)
+        inventory = inventory.where(Product.location == location)
+
+    credit_sales = select(
+        CreditSale.id, CreditSale.date_time, CreditSale.bread_type, CreditSale.quantity, CreditSale.amount_owing,
+        CreditSale.fully_paid, CreditSale.seller_id, seller.username, seller.location, CreditSale.date_time
+    ).outerjoin(seller, seller.id == CreditSale.seller_id).where(
+        *date_range_filters(CreditSale.date_time, start_date, end_date)
     )
+    baker_costs = select(
+        BakerInventory.id, BakerInventory.date_sent, BakerInventory.purchase_cost_total,
+        BakerInventory.usage_cost_total, BakerInventory.seller_id, seller.username, seller.location,
+        BakerInventory.date_sent
+    ).outerjoin(seller, seller.id == BakerInventory.seller_id).where(
+        BakerInventory.status == 'approved', *date_range_filters(BakerInventory.date_sent, start_date, end_date)
+    )
+    if location:
+        credit_sales = credit_sales.where(seller.location == location)
+        baker_costs = baker_costs.where(seller.location == location)
+
+    partitioned = [pa.field('location', pa.string()), pa.field('month', pa.string())]
+    by_location = partitioned[:1]
+    return [
+        ('orders', pa.schema([
+            ('order_id', pa.int64()), ('date_sold', pa.timestamp('us')), ('product_id', pa.int64()),
+            ('identification_number', pa.string()), ('product_name', pa.string()), ('quantity', pa.int32()),
+            ('selling_price', pa.float64()), ('amount', pa.float64()), ('in_stock', pa.int32()),
+            ('seller_id', pa.int64()), ('seller', pa.string()), *partitioned,
+        ]), partitioned, orders.order_by(Order.id)),
+        ('products', pa.schema([
+            ('product_id', pa.int64()), ('identification_number', pa.string()), ('name', pa.string()),
+            ('price', pa.float64()), ('selling_price', pa.float64()), ('in_stock', pa.int32()), *by_location,
+        ]), by_location, products.order_by(Product.id)),
+        ('inventory', pa.schema([
+            ('inventory_id', pa.int64()), ('product_id', pa.int64()), ('identification_number', pa.string()),
+            ('seller_id', pa.int64()), ('seller', pa.string()), ('quantity_in_stock', pa.int32()),
+            ('quantity_sold', pa.int32()), ('in_stock', pa.int32()), *by_location,
+        ]), by_location, inventory.order_by(Inventory.id)),
+        ('credit_sales', pa.schema([
+            ('credit_sale_id', pa.int64()), ('date_time', pa.timestamp('us')), ('bread_type', pa.string()),
+            ('quantity', pa.int32()), ('amount_owing', pa.float64()), ('fully_paid', pa.bool_()),
+            ('seller_id', pa.int64()), ('seller', pa.string()), *partitioned,
+        ]), partitioned, credit_sales.order_by(CreditSale.id)),
+        ('baker_costs', pa.schema([
+            ('baker_inventory_id', pa.int64()), ('date_sent', pa.timestamp('us')), ('purchase_cost', money),
+            ('usage_cost', money), ('seller_id', pa.int64()), ('seller', pa.string()), *partitioned,
+        ]), partitioned, baker_costs.order_by(BakerInventory.id)),
+    ]
+
+
+def _write_partitioned(pa, pq, query, schema, partitions, base_dir):
+    """
+    Stream a row query into hive-style Parquet partitions
+    (location=.../month=.../part-0.parquet), one ParquetWriter per
+    partition, flushing a row group every PARQUET_BATCH_ROWS rows so
+    memory stays bounded. Returns the row count.
+    """
+    from urllib.parse import quote
+
+    width = len(schema) - len(partitions)
+    file_schema = pa.schema(list(schema)[:width])
+    pending = defaultdict(lambda: [[] for _ in range(width)])
+    writers = {}
+    buffered = rows = 0
+
+    def flush():
+        for key, columns in pending.items():
+            if key not in writers:
+                folder = os.path.join(base_dir, *(
+                    f"{field.name}={quote(value, safe='')}" for field, value in zip(partitions, key)
+                ))
+                os.makedirs(folder, exist_ok=True)
+                writers[key] = pq.ParquetWriter(os.path.join(folder, 'part-0.parquet'), file_schema)
+            arrays = [pa.array(values, type=field.type) for values, field in zip(columns, file_schema)]
+            writers[key].write_table(pa.Table.from_arrays(arrays, schema=file_schema))
+        pending.clear()
+
+    try:
+        for row in stream_rows(query):
+            key = [row[width] or 'Unknown']
+            if len(partitions) == 2:
+                key.append(row[width + 1].strftime('%Y-%m') if row[width + 1] else 'unknown')
+            columns = pending[tuple(key)]
+            for column, value in zip(columns, row):
+                column.append(value)
+            rows += 1
+            buffered += 1
+            if buffered >= PARQUET_BATCH_ROWS:
+                flush()
+                buffered = 0
+        flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def write_analytics_parquet(base_dir, start_date='', end_date='', location=''):
+    """
+    Write orders, products, inventory, credit sales and approved baker
+    costs as typed Parquet datasets under base_dir, hive-partitioned by
+    location (and month for dated tables), straight from the DB cursor.
+    Needs pyarrow. Returns rows per dataset.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("The Parquet export needs pyarrow: pip install pyarrow")
+
+    return {
+        name: _write_partitioned(pa, pq, query, schema, partitions, os.path.join(base_dir, name))
+        for name, schema, partitions, query in _analytics_datasets(pa, start_date, end_date, location)
+    }
+
 
+def write_analytics_zip(output, start_date='', end_date='', location=''):
+    """Build the Parquet datasets in a scratch directory and zip them into output. Returns the row count."""
+    import shutil
+    import zipfile
+
+    base_dir = tempfile.mkdtemp(prefix="analytics-")
+    try:
+        counts = write_analytics_parquet(base_dir, start_date, end_date, location)
+        # Parquet pages are already compressed
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+            for folder, _, files in os.walk(base_dir):
+                for file_name in sorted(files):
+                    path = os.path.join(folder, file_name)
+                    archive.write(path, os.path.relpath(path, base_dir))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return sum(counts.values())
+
+
+@app.cli.command("export-parquet")
+@click.option("--out", "out_dir", required=True, help="Directory to write the datasets into.")
+@click.option("--start-date", default='', help="YYYY-MM-DD, dated tables only.")
+@click.option("--end-date", default='', help="YYYY-MM-DD, inclusive.")
+@click.option("--location", default='', help="Only this location.")
+def export_parquet_command(out_dir, start_date, end_date, location):
+    """Write the analytics Parquet datasets to a local directory."""
+    counts = write_analytics_parquet(out_dir, start_date, end_date, location)
+    for name, rows in counts.items():
+        print(f"   {name}: {rows} row(s)")
+    print(f"✅ Parquet datasets written to {out_dir}")
 
 
 @app.route('/admin/baker_inventory')
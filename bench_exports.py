@@ -0,0 +1,183 @@
+"""
+Benchmark for the stock history export.
+
+Seeds --rows stock_history rows (sales, imports, adjustments and deletions
+spread over --products products, --sellers sellers and a few admins), then
+downloads /admin/export-stock-history through the test client:
+
+1) the old export: StockHistory.query.all(), lazy admin/seller/product
+   loads per row, a pandas DataFrame and an openpyxl workbook in memory
+   (mounted at a benchmark-only URL);
+2) the current export as CSV;
+3) the current export as XLSX.
+
+For each it reports time to first byte, total time and bytes. With
+--trace-memory every download runs a second time under tracemalloc to
+report the peak Python heap; tracing slows openpyxl down several times
+over, so timings come from the untraced run.
+
+    python bench_exports.py --rows 500000
+    python bench_exports.py --rows 100000 --trace-memory
+    python bench_exports.py --rows 500000 --database-url postgresql://localhost/jomaviko_bench
+
+Runs against a temporary SQLite file unless --database-url is given; never
+point it at production, it creates tables and inserts benchmark rows.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def _seed(jomaviko, rows, products, sellers):
+    from sqlalchemy import insert
+
+    db = jomaviko.db
+    stamp = time.time_ns()
+    users = [
+        jomaviko.User(username=f"bench-export-{stamp}-{n}", password="x",
+                      role="admin" if n < 3 else "seller", location="Bench")
+        for n in range(sellers + 3)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    admin_ids = [user.id for user in users[:3]]
+    seller_ids = [user.id for user in users[3:]]
+
+    db.session.execute(insert(jomaviko.Product.__table__), [
+        {'name': f"Bench Product {n}", 'price': 100, 'identification_number': f"BX{stamp}-{n}",
+         'in_stock': 1000, 'location': f"Bench{n % 3}"}
+        for n in range(products)
+    ])
+    catalogue = db.session.query(
+        jomaviko.Product.id, jomaviko.Product.identification_number, jomaviko.Product.location
+    ).filter(jomaviko.Product.identification_number.like(f"BX{stamp}-%")).all()
+
+    pick = random.Random(1)
+    started = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for n in range(rows):
+        product_id, identification_number, location = pick.choice(catalogue)
+        kind = pick.choices(['sale', 'import', 'adjustment', 'deletion'], weights=[90, 6, 3, 1])[0]
+        change = -pick.randint(1, 5) if kind in ('sale', 'deletion') else pick.randint(1, 50)
+        batch.append({
+            'kind': kind,
+            'product_id': product_id if kind != 'deletion' else None,
+            'identification_number': identification_number,
+            'location': location,
+            'change_amount': change,
+            'balance_after': pick.randint(0, 1000),
+            'seller_id': pick.choice(seller_ids) if kind == 'sale' else None,
+            'admin_id': pick.choice(admin_ids) if kind in ('adjustment', 'deletion') else None,
+            'reason': 'Benchmark' if kind == 'adjustment' else None,
+            'created_at': started + timedelta(seconds=n * 60),
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(jomaviko.StockHistory.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(jomaviko.StockHistory.__table__), batch)
+
+    admin = users[0]
+    admin.password = jomaviko.generate_password_hash("bench")
+    username = admin.username
+    db.session.commit()
+    return username
+
+
+def _legacy_export():
+    """export_stock_history_excel as it was: ORM rows, lazy loads and pandas."""
+    import app as jomaviko
+    import pandas as pd
+    from io import BytesIO
+    from flask import send_file
+
+    data = []
+    for entry in jomaviko.StockHistory.query.all():
+        data.append({
+            'Date': entry.created_at.strftime('%Y-%m-%d %H:%M:%S') if entry.created_at else '',
+            'Admin': getattr(entry.admin, 'username', entry.admin_id) if entry.admin else entry.admin_id,
+            'Product': getattr(entry.product, 'name', entry.product_id) if entry.product else entry.product_id,
+            'Seller': getattr(entry.seller, 'username', entry.seller_id) if entry.seller else entry.seller_id,
+            'Change': entry.change_amount if entry.change_amount is not None else '',
+            'Reason': entry.reason or '',
+            'Location': getattr(entry.product, 'location', '') if entry.product else '',
+        })
+
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame(data).to_excel(writer, index=False, sheet_name='Stock History')
+    output.seek(0)
+    return send_file(output, download_name='stock_history_filtered.xlsx', as_attachment=True)
+
+
+def _fetch(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    return response.status_code, first_byte, time.perf_counter() - started, size
+
+
+def _download(client, label, url, trace_memory):
+    print(f"\n{label}")
+    status, first_byte, elapsed, size = _fetch(client, url)
+    if status != 200:
+        print(f"   ⚠️ {url} answered {status}")
+        return
+    print(f"   first byte {first_byte:.2f}s, total {elapsed:.2f}s, {size / 1e6:.1f} MB")
+
+    if trace_memory:
+        tracemalloc.start()
+        _fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"   peak Python heap {peak / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000, help="stock_history rows to seed")
+    parser.add_argument("--products", type=int, default=2000, help="products the rows refer to")
+    parser.add_argument("--sellers", type=int, default=50, help="sellers the sales refer to")
+    parser.add_argument("--trace-memory", action="store_true", help="re-run each download under tracemalloc")
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the current export")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_exports.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["SHEETS_BACKEND"] = "memory"
+
+    import app as jomaviko
+
+    jomaviko.app.add_url_rule('/bench/legacy-stock-history', 'bench_legacy_stock_history', _legacy_export)
+
+    print(f"📊 {args.rows} stock_history rows / {args.products} products / db {database_url}")
+    with jomaviko.app.app_context():
+        jomaviko.db.create_all()
+        started = time.perf_counter()
+        username = _seed(jomaviko, args.rows, args.products, args.sellers)
+        print(f"   seeded in {time.perf_counter() - started:.1f}s")
+
+    client = jomaviko.app.test_client()
+    client.post('/login', data={'username': username, 'password': 'bench'})
+
+    if not args.skip_legacy:
+        _download(client, "1) Old export: .all() + lazy loads + pandas, XLSX in memory", '/bench/legacy-stock-history',
+                  args.trace_memory)
+    _download(client, "2) Streaming export, CSV", '/admin/export-stock-history?format=csv', args.trace_memory)
+    _download(client, "3) Streaming export, write-only XLSX", '/admin/export-stock-history?format=xlsx', args.trace_memory)
+
+
+if __name__ == "__main__":
+    main()
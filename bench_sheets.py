@@ -0,0 +1,137 @@
+"""
+Offline benchmark for the Google Sheets import and stock-sync paths.
+
+Seeds fake_sheets.FakeSheetsService with N products spread over M tabs,
+points app.py at it and at a throwaway database, then reports import
+throughput, per-sale sync latency and Sheets API call counts.
+
+    python bench_sheets.py --products 2000 --tabs 3 --sales 200 --latency 0.15
+
+Runs against a temporary SQLite file unless --database-url is given; never
+point it at production, it creates tables and inserts benchmark rows.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
+def _report_calls(fake, label):
+    calls = ", ".join(f"{method}={count}" for method, count in sorted(fake.calls.items())) or "none"
+    print(f"   API calls ({label}): {calls}")
+    fake.reset_counters()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000, help="total products across all tabs")
+    parser.add_argument("--tabs", type=int, default=3, help="number of location tabs")
+    parser.add_argument("--sellers", type=int, default=2, help="sellers per location")
+    parser.add_argument("--sales", type=int, default=200, help="stock changes to sync")
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial seconds per Sheets call")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="fraction of calls failing with 429")
+    parser.add_argument("--quota-per-minute", type=float, default=100000,
+                        help="client-side rate limit (the real quota is 60/min)")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_sheets.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["SHEETS_BACKEND"] = "memory"
+    os.environ["SHEETS_QUOTA_PER_MINUTE"] = str(args.quota_per_minute)
+    os.environ["WEB_CONCURRENCY"] = "1"
+
+    import app as jomaviko
+    from fake_sheets import FakeSheetsService
+
+    locations = [f"Shop{i + 1}" for i in range(args.tabs)]
+    tabs = {location: [["Name", "ID", "Price", "Stock"]] for location in locations}
+    for i in range(args.products):
+        location = locations[i % args.tabs]
+        tabs[location].append([f"Product {i}", f"P{i:06d}", f"{100 + i % 50}.00", str(20 + i % 30)])
+
+    fake = FakeSheetsService(tabs=tabs, latency=args.latency, quota_error_rate=args.quota_error_rate, seed=1)
+    jomaviko.sheets_client.use_backend(fake)
+
+    # The benchmark flushes the write-behind queue itself
+    jomaviko.sheet_sync_queue.interval = 3600
+    jomaviko.sheet_sync_queue.batch_size = max(args.sales, 1) * 2
+
+    print(f"📊 {args.products} products / {args.tabs} tabs / latency {_ms(args.latency)} / db {database_url}")
+
+    with jomaviko.app.app_context():
+        db = jomaviko.db
+        db.create_all()
+        for location in locations:
+            for n in range(args.sellers):
+                db.session.add(jomaviko.User(
+                    username=f"bench-{location}-{n}-{time.time_ns()}",
+                    password="x",
+                    role="seller",
+                    location=location
+                ))
+        db.session.commit()
+
+        print("\n1) Cold import, one location at a time")
+        started = time.perf_counter()
+        for location in locations:
+            summary = jomaviko.get_google_sheet_data_by_location(location, force=True)
+            if summary:
+                print(f"   {jomaviko.format_import_summary(summary)}")
+        elapsed = time.perf_counter() - started
+        print(f"   total {_ms(elapsed)} -> {args.products / elapsed:.0f} rows/s")
+        _report_calls(fake, "cold import")
+
+        print("\n2) Re-import all locations, nothing changed (fingerprints)")
+        started = time.perf_counter()
+        jomaviko.import_all_locations()
+        print(f"   total {_ms(time.perf_counter() - started)}")
+        _report_calls(fake, "unchanged import")
+
+        print("\n3) Re-import all locations, forced full diff")
+        started = time.perf_counter()
+        jomaviko.import_all_locations(force=True)
+        elapsed = time.perf_counter() - started
+        print(f"   total {_ms(elapsed)} -> {args.products / elapsed:.0f} rows/s")
+        _report_calls(fake, "forced import")
+
+        products = jomaviko.Product.query.all()
+        sample = random.Random(2).choices(products, k=args.sales)
+
+        print(f"\n4) {args.sales} sales synced inline (update_google_sheet_stock)")
+        jomaviko.sheet_row_index.invalidate()
+        timings = []
+        for product in sample:
+            started = time.perf_counter()
+            jomaviko.update_google_sheet_stock(product.location, product.identification_number, product.in_stock - 1)
+            db.session.commit()  # keeps a write queued while Sheets was unavailable
+            timings.append(time.perf_counter() - started)
+        print(f"   per sale: median {_ms(statistics.median(timings))}, max {_ms(max(timings))}")
+        _report_calls(fake, "inline sync")
+
+        print(f"\n5) {args.sales} sales through the write-behind queue")
+        jomaviko.sheet_row_index.invalidate()
+        timings = []
+        for product in sample:
+            started = time.perf_counter()
+            jomaviko.enqueue_sheet_stock_update(product.location, product.identification_number, product.in_stock - 2)
+            db.session.commit()
+            timings.append(time.perf_counter() - started)
+        print(f"   request-side per sale: median {_ms(statistics.median(timings))}, max {_ms(max(timings))}")
+        started = time.perf_counter()
+        written = jomaviko.sheet_sync_queue.flush()
+        print(f"   flush: {written} cell(s) in {_ms(time.perf_counter() - started)}")
+        _report_calls(fake, "queued sync")
+
+        print(f"\n   client counters: {jomaviko.sheets_client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Benchmarks for stock reservation on /send-order and place_order.
+
+Contention: many threads sell one unit at a time of the same product until
+it runs out, first with the old read-check-write pattern and then with
+reserve_stock()'s conditional UPDATE ... RETURNING. Reports throughput,
+units sold against the starting stock, and the oversell (units sold beyond
+what existed).
+
+Latency: one seller posts --orders sales one after another to the old
+four-commit place_order flow (mounted at a benchmark-only URL) and to the
+current /order/<id> route, with --sellers inventory rows on the product,
+and reports per-order latency percentiles.
+
+    python bench_stock.py --threads 6 --stock 500 --orders 300 --sellers 50
+    python bench_stock.py --database-url postgresql://localhost/jomaviko_bench
+
+Runs against a temporary SQLite file unless --database-url is given; SQLite
+serialises writers, so contention numbers are only meaningful on Postgres.
+Never point it at production, it creates tables and inserts benchmark rows.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def _seed(jomaviko, stock, threads):
+    db = jomaviko.db
+    stamp = time.time_ns()
+    product = jomaviko.Product(
+        name="Bench Bread", price=100, identification_number=f"BENCH{stamp}",
+        in_stock=stock, location="Bench"
+    )
+    db.session.add(product)
+    db.session.flush()
+
+    sellers = []
+    for n in range(threads):
+        seller = jomaviko.User(username=f"bench-stock-{stamp}-{n}", password="x", role="seller", location="Bench")
+        db.session.add(seller)
+        db.session.flush()
+        db.session.add(jomaviko.Inventory(
+            product_id=product.id, seller_id=seller.id,
+            quantity_in_stock=stock, quantity_sold=0, in_stock=stock
+        ))
+        sellers.append(seller.id)
+    db.session.commit()
+    return product.id, sellers
+
+
+def _legacy_sale(jomaviko, product_id, seller_id):
+    """The pre-reserve_stock flow: read, check in Python, write back."""
+    db = jomaviko.db
+    product = db.session.get(jomaviko.Product, product_id)
+    if product.in_stock < 1:
+        return False
+    product.in_stock -= 1
+    jomaviko.enqueue_sheet_stock_update(product.location, product.identification_number, product.in_stock)
+    db.session.add(jomaviko.Order(
+        product_id=product_id, quantity=1, selling_price=100, amount=100, date_sold=datetime.utcnow(),
+        in_stock=product.in_stock, seller_id=seller_id, location="Bench"
+    ))
+    db.session.commit()
+    return True
+
+
+def _atomic_sale(jomaviko, product_id, seller_id):
+    db = jomaviko.db
+    try:
+        stock = jomaviko.reserve_stock(product_id, 1, seller_id=seller_id)
+    except jomaviko.OutOfStock:
+        db.session.rollback()
+        return False
+    db.session.add(jomaviko.Order(
+        product_id=product_id, quantity=1, selling_price=100, amount=100, date_sold=datetime.utcnow(),
+        in_stock=stock['in_stock'], seller_id=seller_id, location="Bench"
+    ))
+    jomaviko.enqueue_sheet_stock_update(stock['location'], stock['identification_number'], stock['in_stock'])
+    db.session.commit()
+    return True
+
+
+def _run(jomaviko, label, sale, stock, threads):
+    with jomaviko.app.app_context():
+        product_id, sellers = _seed(jomaviko, stock, threads)
+
+    sold = [0] * threads
+    errors = [0] * threads
+    start = threading.Barrier(threads + 1)
+
+    def worker(index):
+        with jomaviko.app.app_context():
+            start.wait()
+            while True:
+                try:
+                    if not sale(jomaviko, product_id, sellers[index]):
+                        break
+                    sold[index] += 1
+                except Exception:
+                    jomaviko.db.session.rollback()
+                    errors[index] += 1
+                    if errors[index] > stock:
+                        break
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with jomaviko.app.app_context():
+        db = jomaviko.db
+        final_stock = db.session.get(jomaviko.Product, product_id).in_stock
+        orders = jomaviko.Order.query.filter_by(product_id=product_id).count()
+        db.session.remove()
+
+    total = sum(sold)
+    print(f"\n{label}")
+    print(f"   {total} sale(s) in {elapsed:.2f}s -> {total / elapsed:.0f} sales/s ({sum(errors)} error(s))")
+    print(f"   starting stock {stock}, final stock {final_stock}, orders {orders}")
+    print(f"   oversell: {max(0, orders - stock)} unit(s); stock drift: {stock - orders - final_stock}")
+
+
+def _legacy_place_order(product_id):
+    """place_order as it was: four commits and a loop over the product's inventories."""
+    import app as jomaviko
+    from flask import request
+    from flask_login import current_user
+
+    db = jomaviko.db
+    quantity = int(request.form['quantity'])
+    selling_price = float(request.form['selling_price'])
+
+    product = db.session.get(jomaviko.Product, product_id)
+    inventory = jomaviko.Inventory.query.filter_by(product_id=product_id, seller_id=current_user.id).first()
+    if not product or not inventory or inventory.quantity_in_stock < quantity:
+        return "out of stock", 400
+
+    inventory.quantity_in_stock -= quantity
+    inventory.quantity_sold += quantity
+    db.session.commit()
+
+    product.in_stock -= quantity
+    db.session.commit()
+
+    jomaviko.enqueue_sheet_stock_update(product.location, product.identification_number, product.in_stock)
+
+    db.session.add(jomaviko.Order(
+        product_id=product_id, quantity=quantity, selling_price=selling_price, amount=quantity * selling_price,
+        in_stock=product.in_stock, date_sold=datetime.utcnow(), seller_id=current_user.id, location="Bench"
+    ))
+    db.session.commit()
+
+    for admin_inventory in jomaviko.Inventory.query.filter_by(product_id=product_id).all():
+        admin_inventory.in_stock = admin_inventory.quantity_in_stock
+    db.session.commit()
+    return "ok", 302
+
+
+def _latency(jomaviko, label, url_for_product, orders, sellers):
+    from werkzeug.security import generate_password_hash
+
+    with jomaviko.app.app_context():
+        product_id, seller_ids = _seed(jomaviko, orders, sellers)
+        seller = jomaviko.db.session.get(jomaviko.User, seller_ids[0])
+        seller.password = generate_password_hash("bench")
+        username = seller.username
+        jomaviko.db.session.commit()
+
+    client = jomaviko.app.test_client()
+    client.post('/login', data={'username': username, 'password': 'bench'})
+
+    timings = []
+    url = url_for_product(product_id)
+    for _ in range(orders):
+        started = time.perf_counter()
+        response = client.post(url, data={'quantity': '1', 'selling_price': '100'})
+        timings.append(time.perf_counter() - started)
+        if response.status_code not in (200, 302):
+            print(f"   ⚠️ {url} answered {response.status_code}")
+            break
+
+    with jomaviko.app.app_context():
+        placed = jomaviko.Order.query.filter_by(product_id=product_id).count()
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"\n{label}")
+    print(f"   {placed} order(s); per order median {statistics.median(timings) * 1000:.1f} ms, "
+          f"p95 {p95 * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=6, help="concurrent sellers (keep within the DB pool size)")
+    parser.add_argument("--stock", type=int, default=500, help="starting stock of the contended product")
+    parser.add_argument("--orders", type=int, default=300, help="sequential place_order calls per latency run")
+    parser.add_argument("--sellers", type=int, default=50, help="inventory rows on the product in the latency runs")
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the current code paths")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_stock.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["SHEETS_BACKEND"] = "memory"
+
+    import app as jomaviko
+
+    # Sheet writes are queued like in production but never flushed here
+    jomaviko.sheet_sync_queue.interval = 3600
+    jomaviko.sheet_sync_queue.batch_size = 10 ** 9
+
+    jomaviko.app.add_url_rule(
+        '/bench/legacy-order/<int:product_id>', 'bench_legacy_order',
+        jomaviko.login_required(_legacy_place_order), methods=['POST']
+    )
+
+    with jomaviko.app.app_context():
+        jomaviko.db.create_all()
+
+    print(f"📊 {args.threads} threads / stock {args.stock} / db {database_url}")
+    if not args.skip_legacy:
+        _run(jomaviko, "1) Read, check in Python, write back", _legacy_sale, args.stock, args.threads)
+    _run(jomaviko, "2) reserve_stock (conditional UPDATE ... RETURNING)", _atomic_sale, args.stock, args.threads)
+
+    if not args.skip_legacy:
+        _latency(jomaviko, f"3) place_order latency, four commits + inventory loop ({args.sellers} inventories)",
+                 lambda product_id: f'/bench/legacy-order/{product_id}', args.orders, args.sellers)
+    _latency(jomaviko, f"4) place_order latency, one transaction ({args.sellers} inventories)",
+             lambda product_id: f'/order/{product_id}', args.orders, args.sellers)
+
+
+if __name__ == "__main__":
+    main()
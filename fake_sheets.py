@@ -0,0 +1,202 @@
+"""
+Offline stand-in for the Google Sheets v4 service.
+
+FakeSheetsService implements the slice of the discovery client that app.py
+uses, with the same call shape:
+
+    service.spreadsheets().get(spreadsheetId=..., fields=...).execute()
+    service.spreadsheets().values().get(spreadsheetId=..., range=...).execute()
+    service.spreadsheets().values().update(spreadsheetId=..., range=..., valueInputOption=..., body=...).execute()
+    service.spreadsheets().values().batchGet(spreadsheetId=..., ranges=[...]).execute()
+    service.spreadsheets().values().batchUpdate(spreadsheetId=..., body={"data": [...]}).execute()
+
+Tabs live in memory as lists of rows (row 1 first), optionally loaded from
+and saved back to a JSON file ({"Tab": [["Name", "ID", "Price", "Stock"], ...]}).
+Every call sleeps for `latency` seconds and fails with an HTTP 429 at
+`quota_error_rate`, and `calls` counts requests per method.
+
+Select it with SHEETS_BACKEND=memory or SHEETS_BACKEND=file:/path/to/sheet.json.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+_A1 = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+
+def _parse_range(a1_range):
+    """'Tab!A2:D' -> ('Tab', first_row, last_row, first_col, last_col), 0-based, None = open."""
+    sheet_name, _, cells = a1_range.rpartition('!')
+    sheet_name = sheet_name.strip("'")
+    start, _, end = cells.partition(':')
+    end = end or start
+
+    start_col, start_row = _A1.match(start.upper()).groups()
+    end_col, end_row = _A1.match(end.upper()).groups()
+
+    first_row = int(start_row) - 1 if start_row else 0
+    last_row = int(end_row) - 1 if end_row else None
+    first_col = _column_index(start_col) if start_col else 0
+    last_col = _column_index(end_col) if end_col else None
+    return sheet_name, first_row, last_row, first_col, last_col
+
+
+class _Request:
+    def __init__(self, service, method, handler):
+        self._service = service
+        self._method = method
+        self._handler = handler
+
+    def execute(self, http=None, num_retries=0):
+        return self._service._call(self._method, self._handler)
+
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId=None, range=None, **kwargs):
+        return _Request(self._service, 'values.get', lambda: self._service._read(range))
+
+    def batchGet(self, spreadsheetId=None, ranges=None, **kwargs):
+        return _Request(self._service, 'values.batchGet', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._service._read(a1_range) for a1_range in ranges or []],
+        })
+
+    def update(self, spreadsheetId=None, range=None, valueInputOption=None, body=None, **kwargs):
+        return _Request(self._service, 'values.update', lambda: self._service._write(range, body['values']))
+
+    def batchUpdate(self, spreadsheetId=None, body=None, **kwargs):
+        def handler():
+            responses = [self._service._write(item['range'], item['values']) for item in body.get('data', [])]
+            return {
+                'spreadsheetId': spreadsheetId,
+                'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+                'responses': responses,
+            }
+        return _Request(self._service, 'values.batchUpdate', handler)
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId=None, fields=None, **kwargs):
+        return _Request(self._service, 'spreadsheets.get', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'sheets': [{'properties': {'title': title}} for title in self._service.tabs],
+        })
+
+    def values(self):
+        return _Values(self._service)
+
+
+class FakeSheetsService:
+    def __init__(self, tabs=None, path=None, latency=0.0, quota_error_rate=0.0, seed=None):
+        self.path = path
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        if tabs is None and path and os.path.exists(path):
+            with open(path) as f:
+                tabs = json.load(f)
+        self.tabs = {title: [list(row) for row in rows] for title, rows in (tabs or {}).items()}
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def reset_counters(self):
+        self.calls.clear()
+
+    def _call(self, method, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            if self.quota_error_rate and self._random.random() < self.quota_error_rate:
+                self.calls['quota_errors'] += 1
+                raise HttpError(
+                    httplib2.Response({'status': 429, 'reason': 'Too Many Requests'}),
+                    b'{"error": {"code": 429, "message": "Quota exceeded (fake)", "status": "RESOURCE_EXHAUSTED"}}',
+                    uri=method
+                )
+            return handler()
+
+    def _rows(self, sheet_name):
+        if sheet_name not in self.tabs:
+            raise HttpError(
+                httplib2.Response({'status': 400, 'reason': 'Bad Request'}),
+                f'{{"error": {{"code": 400, "message": "Unable to parse range: {sheet_name}"}}}}'.encode(),
+            )
+        return self.tabs[sheet_name]
+
+    def _read(self, a1_range):
+        sheet_name, first_row, last_row, first_col, last_col = _parse_range(a1_range)
+        rows = self._rows(sheet_name)
+        stop_row = len(rows) if last_row is None else min(last_row + 1, len(rows))
+
+        values = []
+        for row in rows[first_row:stop_row]:
+            cells = row[first_col:] if last_col is None else row[first_col:last_col + 1]
+            values.append([str(cell) for cell in cells])
+
+        # Like the real API, drop trailing empty rows
+        while values and not any(values[-1]):
+            values.pop()
+
+        result = {'range': a1_range, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def _write(self, a1_range, values):
+        sheet_name, first_row, _, first_col, _ = _parse_range(a1_range)
+        rows = self._rows(sheet_name)
+
+        cells = 0
+        for offset, new_row in enumerate(values):
+            row_index = first_row + offset
+            while len(rows) <= row_index:
+                rows.append([])
+            row = rows[row_index]
+            while len(row) < first_col + len(new_row):
+                row.append('')
+            for col_offset, value in enumerate(new_row):
+                row[first_col + col_offset] = value
+                cells += 1
+
+        if self.path:
+            self.save()
+        return {'updatedRange': a1_range, 'updatedCells': cells}
+
+    def save(self, path=None):
+        with open(path or self.path, 'w') as f:
+            json.dump(self.tabs, f)
+
+
+def from_backend_setting(setting):
+    """Build a fake from a SHEETS_BACKEND value ('memory' or 'file:<path>')."""
+    latency = float(os.getenv("FAKE_SHEETS_LATENCY", "0"))
+    quota_error_rate = float(os.getenv("FAKE_SHEETS_QUOTA_ERROR_RATE", "0"))
+    if setting.startswith("file:"):
+        return FakeSheetsService(path=setting[len("file:"):], latency=latency, quota_error_rate=quota_error_rate)
+    return FakeSheetsService(latency=latency, quota_error_rate=quota_error_rate)
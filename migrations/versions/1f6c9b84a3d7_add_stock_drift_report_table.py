@@ -0,0 +1,42 @@
+"""Add stock_drift_report table
+
+Revision ID: 1f6c9b84a3d7
+Revises: e9a2c05d7b13
+Create Date: 2026-10-18 13:20:51.336042
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6c9b84a3d7'
+down_revision = 'e9a2c05d7b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_drift_report',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('cells_checked', sa.Integer(), nullable=False),
+    sa.Column('cells_changed', sa.Integer(), nullable=False),
+    sa.Column('missing_in_sheet', sa.Integer(), nullable=False),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('seconds', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_drift_report', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_drift_report_location'), ['location'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_drift_report', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_drift_report_location'))
+
+    op.drop_table('stock_drift_report')
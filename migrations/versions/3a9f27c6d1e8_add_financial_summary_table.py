@@ -0,0 +1,42 @@
+"""Add financial_summary table
+
+Revision ID: 3a9f27c6d1e8
+Revises: 7d41e0c8f5b2
+Create Date: 2026-10-18 15:02:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9f27c6d1e8'
+down_revision = '7d41e0c8f5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('financial_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('sales_total', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('purchase_cost', sa.Float(), nullable=False),
+    sa.Column('usage_cost', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location', 'day', name='uq_financial_summary_location_day')
+    )
+    with op.batch_alter_table('financial_summary', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_financial_summary_day'), ['day'], unique=False)
+
+    # Existing rows are backfilled with `flask rebuild-financial-summary`
+
+
+def downgrade():
+    with op.batch_alter_table('financial_summary', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_financial_summary_day'))
+
+    op.drop_table('financial_summary')
@@ -0,0 +1,45 @@
+"""Add sheet import fingerprint tables
+
+Revision ID: 5b8d3f61e2a4
+Revises: c4e1a7d2b9f0
+Create Date: 2026-10-18 10:41:07.552931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d3f61e2a4'
+down_revision = 'c4e1a7d2b9f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sheet_tab_fingerprint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('digest', sa.String(length=40), nullable=False),
+    sa.Column('sellers_digest', sa.String(length=40), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('imported_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location')
+    )
+    op.create_table('sheet_row_fingerprint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('identification_number', sa.String(length=100), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('in_stock', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location', 'identification_number', name='uq_sheet_row_fingerprint')
+    )
+
+
+def downgrade():
+    op.drop_table('sheet_row_fingerprint')
+    op.drop_table('sheet_tab_fingerprint')
@@ -0,0 +1,74 @@
+"""Add cost total columns to baker_inventory
+
+Revision ID: 6c2d84f0a3b5
+Revises: 3a9f27c6d1e8
+Create Date: 2026-10-18 15:41:17.204736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2d84f0a3b5'
+down_revision = '3a9f27c6d1e8'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copies of app.compute_purchase_cost / compute_usage_cost, so the
+# backfill does not depend on the application module
+def _purchase_cost(purchases):
+    if isinstance(purchases, dict):
+        purchases = list(purchases.values())
+    if not isinstance(purchases, list):
+        return 0
+    return sum((item.get("cost", 0) or 0) for item in purchases)
+
+
+def _usage_cost(breads):
+    if isinstance(breads, dict):
+        breads = [breads]
+    if not isinstance(breads, list):
+        return 0
+    return sum(
+        (ing.get("usage_cost", ing.get("cost", 0)) or 0)
+        for bread in breads
+        for ing in bread.get("ingredients", [])
+    )
+
+
+def upgrade():
+    with op.batch_alter_table('baker_inventory', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('purchase_cost_total', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('usage_cost_total', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_baker_inventory_status'), ['status'], unique=False)
+
+    baker_inventory = sa.table(
+        'baker_inventory',
+        sa.column('id', sa.Integer),
+        sa.column('purchases', sa.JSON),
+        sa.column('breads', sa.JSON),
+        sa.column('purchase_cost_total', sa.Numeric(12, 2)),
+        sa.column('usage_cost_total', sa.Numeric(12, 2)),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(baker_inventory.c.id, baker_inventory.c.purchases, baker_inventory.c.breads)).all()
+    updates = [
+        {'row_id': row.id, 'purchase': _purchase_cost(row.purchases), 'usage': _usage_cost(row.breads)}
+        for row in rows
+    ]
+    if updates:
+        bind.execute(
+            baker_inventory.update()
+            .where(baker_inventory.c.id == sa.bindparam('row_id'))
+            .values(purchase_cost_total=sa.bindparam('purchase'), usage_cost_total=sa.bindparam('usage')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('baker_inventory', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_baker_inventory_status'))
+        batch_op.drop_column('usage_cost_total')
+        batch_op.drop_column('purchase_cost_total')
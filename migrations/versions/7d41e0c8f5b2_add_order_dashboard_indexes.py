@@ -0,0 +1,28 @@
+"""Add order indexes for the admin dashboard
+
+Revision ID: 7d41e0c8f5b2
+Revises: 1f6c9b84a3d7
+Create Date: 2026-10-18 14:36:09.127554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d41e0c8f5b2'
+down_revision = '1f6c9b84a3d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_date_sold_id', ['date_sold', 'id'], unique=False)
+        batch_op.create_index('ix_order_location', ['location'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_location')
+        batch_op.drop_index('ix_order_date_sold_id')
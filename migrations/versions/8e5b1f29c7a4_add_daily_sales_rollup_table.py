@@ -0,0 +1,42 @@
+"""Add daily_sales_rollup table
+
+Revision ID: 8e5b1f29c7a4
+Revises: 6c2d84f0a3b5
+Create Date: 2026-10-18 16:20:05.733912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e5b1f29c7a4'
+down_revision = '6c2d84f0a3b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location', 'product_id', 'seller_id', 'day', name='uq_daily_sales_rollup_bucket')
+    )
+    with op.batch_alter_table('daily_sales_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_sales_rollup_location_day', ['location', 'day'], unique=False)
+
+    # Existing orders are backfilled with `flask rebuild-sales-rollup`
+
+
+def downgrade():
+    with op.batch_alter_table('daily_sales_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_sales_rollup_location_day')
+
+    op.drop_table('daily_sales_rollup')
@@ -0,0 +1,49 @@
+"""Add export_job table
+
+Revision ID: a5c9e1f3d820
+Revises: f3b8c2d74a19
+Create Date: 2026-10-18 21:14:09.337152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5c9e1f3d820'
+down_revision = 'f3b8c2d74a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('export_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('data_version', sa.String(length=40), nullable=False),
+    sa.Column('cache_key', sa.String(length=40), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('requested_by', sa.Integer(), nullable=True),
+    sa.Column('rows_written', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('file_name', sa.String(length=200), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['requested_by'], ['user.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_export_job_cache_key'), ['cache_key'], unique=False)
+        batch_op.create_index(batch_op.f('ix_export_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_export_job_status'))
+        batch_op.drop_index(batch_op.f('ix_export_job_cache_key'))
+
+    op.drop_table('export_job')
@@ -0,0 +1,28 @@
+"""Add idempotency_key to order
+
+Revision ID: b7f3c1e94d26
+Revises: 8e5b1f29c7a4
+Create Date: 2026-10-18 17:08:52.610447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3c1e94d26'
+down_revision = '8e5b1f29c7a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_order_idempotency_key'), ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_idempotency_key'))
+        batch_op.drop_column('idempotency_key')
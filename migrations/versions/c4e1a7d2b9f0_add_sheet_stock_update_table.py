@@ -0,0 +1,41 @@
+"""Add sheet_stock_update table
+
+Revision ID: c4e1a7d2b9f0
+Revises: bfb18ce5a809
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a7d2b9f0'
+down_revision = 'bfb18ce5a809'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sheet_stock_update',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sheet_name', sa.String(length=100), nullable=False),
+    sa.Column('identification_number', sa.String(length=100), nullable=False),
+    sa.Column('new_stock', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sheet_name', 'identification_number', name='uq_sheet_stock_update_cell')
+    )
+    with op.batch_alter_table('sheet_stock_update', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sheet_stock_update_next_attempt_at'), ['next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sheet_stock_update', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sheet_stock_update_next_attempt_at'))
+
+    op.drop_table('sheet_stock_update')
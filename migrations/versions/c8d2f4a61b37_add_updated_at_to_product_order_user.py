@@ -0,0 +1,28 @@
+"""Add updated_at to product, order and user
+
+Revision ID: c8d2f4a61b37
+Revises: a5c9e1f3d820
+Create Date: 2026-10-18 19:12:40.531208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d2f4a61b37'
+down_revision = 'a5c9e1f3d820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('product', 'order', 'user'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    for table in ('user', 'order', 'product'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
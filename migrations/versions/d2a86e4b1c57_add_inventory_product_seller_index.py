@@ -0,0 +1,26 @@
+"""Add inventory (product_id, seller_id) index
+
+Revision ID: d2a86e4b1c57
+Revises: b7f3c1e94d26
+Create Date: 2026-10-18 17:35:26.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a86e4b1c57'
+down_revision = 'b7f3c1e94d26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.create_index('ix_inventory_product_seller', ['product_id', 'seller_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_product_seller')
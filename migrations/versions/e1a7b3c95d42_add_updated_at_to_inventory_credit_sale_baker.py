@@ -0,0 +1,28 @@
+"""Add updated_at to inventory, credit_sale and baker_inventory
+
+Revision ID: e1a7b3c95d42
+Revises: c8d2f4a61b37
+Create Date: 2026-10-18 19:34:08.918266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7b3c95d42'
+down_revision = 'c8d2f4a61b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('inventory', 'credit_sale', 'baker_inventory'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    for table in ('baker_inventory', 'credit_sale', 'inventory'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,60 @@
+"""Add stock ledger columns and stock_snapshot table
+
+Revision ID: f3b8c2d74a19
+Revises: d2a86e4b1c57
+Create Date: 2026-10-18 19:02:41.513870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8c2d74a19'
+down_revision = 'd2a86e4b1c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('balance_after', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('location', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('identification_number', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_stock_history_key_created', ['location', 'identification_number', 'created_at'], unique=False)
+        batch_op.create_index('ix_stock_history_created_at', ['created_at'], unique=False)
+        # Ledger rows must survive product deletion
+        batch_op.drop_constraint('stock_history_product_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('stock_history_product_id_fkey', 'product', ['product_id'], ['id'], ondelete='SET NULL')
+
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('identification_number', sa.String(length=100), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('in_stock', sa.Integer(), nullable=False),
+    sa.Column('units_in', sa.Integer(), nullable=False),
+    sa.Column('units_out', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location', 'identification_number', 'taken_at', name='uq_stock_snapshot_key_taken')
+    )
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_snapshot_taken_at', ['taken_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_snapshot_taken_at')
+
+    op.drop_table('stock_snapshot')
+
+    with op.batch_alter_table('stock_history', schema=None) as batch_op:
+        batch_op.drop_constraint('stock_history_product_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('stock_history_product_id_fkey', 'product', ['product_id'], ['id'])
+        batch_op.drop_index('ix_stock_history_created_at')
+        batch_op.drop_index('ix_stock_history_key_created')
+        batch_op.drop_column('identification_number')
+        batch_op.drop_column('location')
+        batch_op.drop_column('balance_after')
+        batch_op.drop_column('kind')
@@ -0,0 +1,30 @@
+"""Make order idempotency_key unique per seller
+
+Revision ID: f6b2d8e14c93
+Revises: e1a7b3c95d42
+Create Date: 2026-10-18 20:05:31.447019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b2d8e14c93'
+down_revision = 'e1a7b3c95d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_idempotency_key'))
+        batch_op.create_index(batch_op.f('ix_order_idempotency_key'), ['idempotency_key'], unique=False)
+        batch_op.create_unique_constraint('uq_order_seller_idempotency_key', ['seller_id', 'idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_order_seller_idempotency_key', type_='unique')
+        batch_op.drop_index(batch_op.f('ix_order_idempotency_key'))
+        batch_op.create_index(batch_op.f('ix_order_idempotency_key'), ['idempotency_key'], unique=True)